@@ -2,19 +2,31 @@
 """Module for filtering sensitive information from log messages."""
 
 
+import asyncio
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import (Any, Callable, Iterable, Iterator, NamedTuple, Optional,
+                    Tuple)
+
 import bcrypt
 
+BCRYPT_ROUNDS = int(os.environ.get("BCRYPT_ROUNDS", 12))
+
 
-def hash_password(password: str) -> bytes:
+def hash_password(password: str, rounds: int = None) -> bytes:
     """Generate a salt
 
     Args:
         password (str): _description_
+        rounds (int): bcrypt work factor, defaults to BCRYPT_ROUNDS
 
     Returns:
         bytes: _description_
     """
-    salt = bcrypt.gensalt()
+    salt = bcrypt.gensalt(rounds or BCRYPT_ROUNDS)
     # Hash the password with the salt
     hashed_password = bcrypt.hashpw(password.encode(), salt)
     return hashed_password
@@ -31,3 +43,263 @@ def is_valid(hashed_password: bytes, password: str) -> bool:
         bool: _description_
     """
     return bcrypt.checkpw(password.encode(), hashed_password)
+
+
+def hash_cost(hashed_password: bytes) -> Optional[int]:
+    """Read the work factor of a bcrypt hash
+
+    Args:
+        hashed_password (bytes): hash such as b"$2b$12$..."
+
+    Returns:
+        Optional[int]: the cost, None if the hash is not bcrypt
+    """
+    try:
+        return int(hashed_password.split(b"$")[2])
+    except (IndexError, ValueError):
+        return None
+
+
+def needs_rehash(hashed_password: bytes, rounds: int = None) -> bool:
+    """Check whether a hash was made with another work factor
+
+    Args:
+        hashed_password (bytes): stored hash
+        rounds (int): target work factor, defaults to BCRYPT_ROUNDS
+
+    Returns:
+        bool: True if the hash should be recomputed
+    """
+    cost = hash_cost(hashed_password)
+    return cost is not None and cost != (rounds or BCRYPT_ROUNDS)
+
+
+class BatchResult(NamedTuple):
+    """Result of one item of a batch call and its time on the pool
+    """
+    value: Any
+    seconds: float
+
+
+def _timed(fn: Callable[..., Any], *args: Any) -> BatchResult:
+    """Run a call and measure it
+    """
+    start = time.perf_counter()
+    value = fn(*args)
+    return BatchResult(value, time.perf_counter() - start)
+
+
+class PasswordHasher:
+    """Bounded thread pool running bcrypt off the caller thread
+
+    bcrypt releases the GIL, so hashes run in parallel on the pool.
+    At most `max_pending` calls are queued or running, further callers
+    wait for a slot.
+    """
+
+    def __init__(self, rounds: int = None, max_workers: int = None,
+                 max_pending: int = None, timeout: float = None):
+        """Initialize the hasher
+
+        Args:
+            rounds (int): bcrypt work factor, defaults to BCRYPT_ROUNDS
+            max_workers (int): pool threads, defaults to the CPU count
+            max_pending (int): queued and running calls allowed,
+                defaults to twice the pool size
+            timeout (float): seconds to wait for a slot, None waits
+                forever
+        """
+        self.rounds = rounds or BCRYPT_ROUNDS
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(self.max_workers,
+                                            thread_name_prefix="bcrypt")
+        self.max_pending = max_pending or 2 * self.max_workers
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+
+    def submit(self, fn: Callable[..., Any], *args: Any,
+               wait: bool = True) -> Optional[Future]:
+        """Run a call on the pool once a slot is free
+
+        Args:
+            fn (Callable[..., Any]): function to run
+            *args (Any): its arguments
+            wait (bool): wait for a slot, otherwise give up at once
+
+        Returns:
+            Optional[Future]: future of the call, None if `wait` is
+            False and the pool is saturated
+
+        Raises:
+            TimeoutError: no slot was freed in time
+        """
+        if not wait:
+            if not self._slots.acquire(blocking=False):
+                return None
+        elif not self._slots.acquire(timeout=self.timeout):
+            raise TimeoutError("password hashing pool is saturated")
+        try:
+            future = self._executor.submit(fn, *args)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+    def hash(self, password: str) -> bytes:
+        """Hash a password on the pool
+
+        Args:
+            password (str): password to hash
+
+        Returns:
+            bytes: the salted hash
+        """
+        return self.submit(hash_password, password, self.rounds).result()
+
+    def verify(self, hashed_password: bytes, password: str) -> bool:
+        """Check a password against its hash on the pool
+
+        Args:
+            hashed_password (bytes): stored hash
+            password (str): password to check
+
+        Returns:
+            bool: True if the password matches
+        """
+        return self.submit(is_valid, hashed_password, password).result()
+
+    def verify_and_upgrade(self, hashed_password: bytes, password: str,
+                           on_upgrade: Callable[[bytes], None]) -> bool:
+        """Check a password and refresh a hash made with another cost
+
+        On success with an outdated cost, the new hash is computed in
+        the background and handed to `on_upgrade`, the caller does not
+        wait for it. The upgrade is skipped while the pool is saturated
+        and retried on the next login.
+
+        Args:
+            hashed_password (bytes): stored hash
+            password (str): password to check
+            on_upgrade (Callable[[bytes], None]): stores the new hash
+
+        Returns:
+            bool: True if the password matches
+        """
+        def store(done: Future) -> None:
+            """Hand a successfully computed hash to the caller"""
+            if done.exception() is None:
+                on_upgrade(done.result())
+
+        valid = self.verify(hashed_password, password)
+        if valid and needs_rehash(hashed_password, self.rounds):
+            future = self.submit(hash_password, password, self.rounds,
+                                 wait=False)
+            if future is not None:
+                future.add_done_callback(store)
+        return valid
+
+    async def hash_async(self, password: str) -> bytes:
+        """Hash a password without blocking the event loop
+
+        Args:
+            password (str): password to hash
+
+        Returns:
+            bytes: the salted hash
+        """
+        return await self._submit_async(hash_password, password, self.rounds)
+
+    async def verify_async(self, hashed_password: bytes,
+                           password: str) -> bool:
+        """Check a password without blocking the event loop
+
+        Args:
+            hashed_password (bytes): stored hash
+            password (str): password to check
+
+        Returns:
+            bool: True if the password matches
+        """
+        return await self._submit_async(is_valid, hashed_password, password)
+
+    async def _submit_async(self, fn: Callable[..., Any], *args: Any) -> Any:
+        """Wait for a slot off the event loop, then await the call
+        """
+        loop = asyncio.get_running_loop()
+        future = await loop.run_in_executor(None, self.submit, fn, *args)
+        return await asyncio.wrap_future(future)
+
+    def map(self, fn: Callable[..., Any],
+            args_list: Iterable[Tuple]) -> Iterator[BatchResult]:
+        """Fan calls out over the pool and stream their results in order
+
+        Only a window of `max_pending` calls is in flight, so the input
+        may be a lazy iterable of any size.
+
+        Args:
+            fn (Callable[..., Any]): function to run
+            args_list (Iterable[Tuple]): arguments of each call
+
+        Yields:
+            BatchResult: result and duration of each call, in input order
+        """
+        window = deque()
+        for args in args_list:
+            window.append(self.submit(_timed, fn, *args))
+            if len(window) >= self.max_pending:
+                yield window.popleft().result()
+        while window:
+            yield window.popleft().result()
+
+    def shutdown(self, wait: bool = True) -> None:
+        """Stop the pool
+
+        Args:
+            wait (bool): wait for the pending calls to finish
+        """
+        self._executor.shutdown(wait)
+
+
+def hash_passwords(passwords: Iterable[str], rounds: int = None,
+                   hasher: PasswordHasher = None) -> Iterator[BatchResult]:
+    """Hash many passwords in parallel
+
+    Args:
+        passwords (Iterable[str]): passwords to hash
+        rounds (int): bcrypt work factor, defaults to the hasher's
+        hasher (PasswordHasher): pool to use, a temporary one by default
+
+    Yields:
+        BatchResult: hash and hashing time of each password, in order
+    """
+    owned = hasher is None
+    if owned:
+        hasher = PasswordHasher(rounds)
+    try:
+        yield from hasher.map(hash_password, (
+            (password, rounds or hasher.rounds) for password in passwords))
+    finally:
+        if owned:
+            hasher.shutdown()
+
+
+def verify_many(pairs: Iterable[Tuple[bytes, str]],
+                hasher: PasswordHasher = None) -> Iterator[BatchResult]:
+    """Check many (hashed_password, password) pairs in parallel
+
+    Args:
+        pairs (Iterable[Tuple[bytes, str]]): hashes and passwords
+        hasher (PasswordHasher): pool to use, a temporary one by default
+
+    Yields:
+        BatchResult: validity and checking time of each pair, in order
+    """
+    owned = hasher is None
+    if owned:
+        hasher = PasswordHasher()
+    try:
+        yield from hasher.map(is_valid, pairs)
+    finally:
+        if owned:
+            hasher.shutdown()
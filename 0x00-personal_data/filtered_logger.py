@@ -2,13 +2,24 @@
 """Module for filtering sensitive information from log messages."""
 
 
+import atexit
 import logging
+import logging.handlers
+import queue
 import re
 import os
+import threading
+import time
 import mysql.connector
-from typing import List
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import (Any, Callable, Dict, FrozenSet, Iterable, Iterator,
+                    List, Pattern, Sequence, Tuple)
 
 PII_FIELDS = ("name", "email", "phone", "ssn", "password")
+EXPORT_BATCH_SIZE = 1000
+LOG_QUEUE_SIZE = 10000
+DB_POOL_SIZE = 5
 
 
 class RedactingFormatter(logging.Formatter):
@@ -19,14 +30,20 @@ class RedactingFormatter(logging.Formatter):
     FORMAT = "[HOLBERTON] %(name)s %(levelname)s %(asctime)-15s: %(message)s"
     SEPARATOR = ";"
 
-    def __init__(self, fields: List[str]):
-        """_summary_
+    def __init__(self, fields: List[str], engine: str = "regex"):
+        """Initialize the formatter
 
         Args:
-            fields (List[str]): _description_
+            fields (List[str]): names of the fields to redact
+            engine (str): key of the redaction engine in ENGINES
         """
         super(RedactingFormatter, self).__init__(self.FORMAT)
         self.fields = fields
+        self.engine = ENGINES[engine]
+        # The fields are fixed: resolve their pattern once, not per line
+        self._prepared = self.engine.prepare(fields, self.SEPARATOR)
+        self._prepared_block = self.engine.prepare(
+            fields, self.SEPARATOR, multiline=True)
 
     def format(self, record: logging.LogRecord) -> str:
         """_summary_
@@ -37,31 +54,335 @@ class RedactingFormatter(logging.Formatter):
         Returns:
             str: _description_
         """
-        record.msg = filter_datum(
-            self.fields, self.REDACTION, record.msg, self.SEPARATOR)
+        record.msg = self.engine.redact(
+            self._prepared, self.REDACTION, record.msg, self.SEPARATOR)
         return super(RedactingFormatter, self).format(record)
 
+    def format_batch(self, name: str, level: int,
+                     messages: Iterable[str]) -> str:
+        """Format many messages at once, redacting them in a single pass
+
+        All the lines of a batch share one timestamp. Line breaks inside
+        a message are escaped first: the batch pattern stops a value at
+        a line end, a raw one would leave the rest of the value unredacted
+        on a line of its own.
+
+        Args:
+            name (str): logger name written in each line
+            level (int): logging level written in each line
+            messages (Iterable[str]): messages to format, one line each
+
+        Returns:
+            str: the formatted lines, newline terminated
+        """
+        block = self.engine.redact_lines(
+            self._prepared_block, self.REDACTION,
+            map(escape_line_breaks, messages), self.SEPARATOR)
+        if not block:
+            return ""
+        record = logging.makeLogRecord({
+            "name": name, "levelno": level,
+            "levelname": logging.getLevelName(level), "msg": ""})
+        prefix = super(RedactingFormatter, self).format(record)
+        return prefix + block.replace("\n", "\n" + prefix) + "\n"
+
+
+class RedactionEngine:
+    """Regex redaction engine keeping an LRU of compiled field patterns
+    """
+
+    def __init__(self, maxsize: int = 128):
+        """Initialize the engine
+
+        Args:
+            maxsize (int): number of compiled patterns kept in the cache
+        """
+        self.maxsize = maxsize
+        self._cache: "OrderedDict[Tuple, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def pattern(self, fields: Sequence[str], separator: str,
+                multiline: bool = False) -> Pattern:
+        """Get the compiled pattern for a (fields, separator) pair
+
+        Args:
+            fields (Sequence[str]): names of the fields to redact
+            separator (str): character separating the fields
+            multiline (bool): stop field values at line ends too
+
+        Returns:
+            Pattern: compiled pattern, built once per pair
+        """
+        fields = tuple(fields)
+        stop = re.escape(separator) + ("\n" if multiline else "")
+        return self._cached(
+            (fields, separator, multiline), lambda: re.compile(
+                f'({"|".join(map(re.escape, fields))})=([^{stop}]*)'))
+
+    def prepare(self, fields: Sequence[str], separator: str,
+                multiline: bool = False) -> Any:
+        """Resolve a field list once, for `redact` and `redact_lines`
+
+        Args:
+            fields (Sequence[str]): names of the fields to redact
+            separator (str): character separating the fields
+            multiline (bool): prepare for `redact_lines`
+
+        Returns:
+            Any: the compiled pattern
+        """
+        return self.pattern(fields, separator, multiline)
+
+    def _cached(self, key: Tuple, build: Callable[[], Any]) -> Any:
+        """Get a compiled object from the LRU, building it on a miss
+        """
+        with self._lock:
+            value = self._cache.get(key)
+            if value is not None:
+                self._cache.move_to_end(key)
+                return value
+            value = self._cache[key] = build()
+            if len(self._cache) > self.maxsize:
+                self._cache.popitem(last=False)
+            return value
+
+    def filter_datum(self, fields: Sequence[str],
+                     redaction: str, message: str, separator: str) -> str:
+        """Obfuscate the values of the given fields in a log message
+
+        Args:
+            fields (Sequence[str]): names of the fields to redact
+            redaction (str): replacement for the field values
+            message (str): log line to redact
+            separator (str): character separating the fields
+
+        Returns:
+            str: the redacted message
+        """
+        return self.redact(self.prepare(fields, separator), redaction,
+                           message, separator)
+
+    def redact(self, prepared: Any, redaction: str, message: str,
+               separator: str) -> str:
+        """Obfuscate a log message with a prepared field list
+
+        Args:
+            prepared (Any): result of `prepare`
+            redaction (str): replacement for the field values
+            message (str): log line to redact
+            separator (str): character separating the fields
+
+        Returns:
+            str: the redacted message
+        """
+        return prepared.sub(f'\\1={redaction}', message)
+
+    def redact_block(self, fields: Sequence[str], redaction: str,
+                     lines: Iterable[str], separator: str) -> str:
+        """Redact many lines with one substitution over the joined block
+
+        Args:
+            fields (Sequence[str]): names of the fields to redact
+            redaction (str): replacement for the field values
+            lines (Iterable[str]): single-line messages to redact
+            separator (str): character separating the fields
+
+        Returns:
+            str: the redacted lines joined with newlines
+        """
+        return self.redact_lines(self.prepare(fields, separator, True),
+                                 redaction, lines, separator)
+
+    def redact_lines(self, prepared: Any, redaction: str,
+                     lines: Iterable[str], separator: str) -> str:
+        """Redact many lines with a field list prepared for multiline use
+
+        Args:
+            prepared (Any): result of `prepare` with multiline set
+            redaction (str): replacement for the field values
+            lines (Iterable[str]): single-line messages to redact
+            separator (str): character separating the fields
+
+        Returns:
+            str: the redacted lines joined with newlines
+        """
+        return prepared.sub(f'\\1={redaction}', "\n".join(lines))
+
+
+class TokenRedactionEngine(RedactionEngine):
+    """Redaction engine splitting lines on the separator instead of
+    matching an alternation regex. Once its field set is prepared, the
+    cost of a line does not grow with the number of redacted fields.
+
+    Field names are matched exactly, surrounding whitespace aside,
+    where the regex engine also matches them as key suffixes.
+    """
+
+    def field_set(self, fields: Sequence[str]) -> FrozenSet[str]:
+        """Get the hashed set of a field list, built once per list
+
+        Args:
+            fields (Sequence[str]): names of the fields to redact
+
+        Returns:
+            FrozenSet[str]: the field names
+        """
+        fields = tuple(fields)
+        return self._cached((fields,), lambda: frozenset(fields))
+
+    def prepare(self, fields: Sequence[str], separator: str,
+                multiline: bool = False) -> FrozenSet[str]:
+        """Resolve a field list once, for `redact` and `redact_lines`
+
+        Args:
+            fields (Sequence[str]): names of the fields to redact
+            separator (str): character separating the fields
+            multiline (bool): unused, lines are split before matching
+
+        Returns:
+            FrozenSet[str]: the field names
+        """
+        return self.field_set(fields)
+
+    def redact(self, prepared: FrozenSet[str], redaction: str,
+               message: str, separator: str) -> str:
+        """Obfuscate a log message with a prepared field set
+
+        Args:
+            prepared (FrozenSet[str]): result of `prepare`
+            redaction (str): replacement for the field values
+            message (str): log line to redact
+            separator (str): character separating the fields
+
+        Returns:
+            str: the redacted message
+        """
+        tokens = message.split(separator)
+        for i, token in enumerate(tokens):
+            key, eq, _ = token.partition("=")
+            if eq and key.strip() in prepared:
+                tokens[i] = f"{key}={redaction}"
+        return separator.join(tokens)
+
+    def redact_lines(self, prepared: FrozenSet[str], redaction: str,
+                     lines: Iterable[str], separator: str) -> str:
+        """Redact many lines and join them with newlines
+
+        Args:
+            prepared (FrozenSet[str]): result of `prepare`
+            redaction (str): replacement for the field values
+            lines (Iterable[str]): single-line messages to redact
+            separator (str): character separating the fields
+
+        Returns:
+            str: the redacted lines joined with newlines
+        """
+        return "\n".join(
+            self.redact(prepared, redaction, line, separator)
+            for line in "\n".join(lines).split("\n"))
+
+
+def escape_line_breaks(message: str) -> str:
+    """Escape the carriage returns and line feeds of a message
+
+    Args:
+        message (str): message to write on a single line
+
+    Returns:
+        str: the message with `\\r` and `\\n` escaped
+    """
+    if "\n" not in message and "\r" not in message:
+        return message
+    return message.replace("\r", "\\r").replace("\n", "\\n")
+
+
+_engine = RedactionEngine()
+ENGINES = {"regex": _engine, "token": TokenRedactionEngine()}
+
 
 def filter_datum(fields: List[str],
                  redaction: str, message: str, separator: str) -> str:
-    """_summary_
+    """Obfuscate the values of the given fields in a log message
 
     Args:
-        fields (_type_): _description_
-        redaction (_type_): _description_
-        message (_type_): _description_
-        separator (_type_): _description_
+        fields (List[str]): names of the fields to redact
+        redaction (str): replacement for the field values
+        message (str): log line to redact
+        separator (str): character separating the fields
+
+    Returns:
+        str: the redacted message
     """
-    return re.sub(
-        f'({"|".join(map(re.escape, fields))})=([^{separator}]*)',
-        f'\\1={redaction}', message)
+    return _engine.filter_datum(fields, redaction, message, separator)
 
 
-def get_logger() -> logging.Logger:
-    """_summary_
+class RedactingQueueHandler(logging.handlers.QueueHandler):
+    """Queue handler leaving redaction and output to a listener thread
+    """
+
+    def __init__(self, log_queue: queue.Queue, policy: str = "block"):
+        """Initialize the handler
+
+        Args:
+            log_queue (queue.Queue): bounded queue shared with the listener
+            policy (str): "block" waits for room when the queue is full,
+                "drop" discards the record and counts it in `dropped`
+        """
+        if policy not in ("block", "drop"):
+            raise ValueError(f"unknown queue policy: {policy}")
+        super(RedactingQueueHandler, self).__init__(log_queue)
+        self.policy = policy
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        """Hand the record over untouched, the listener formats it
+
+        Args:
+            record (logging.LogRecord): record emitted by the logger
+
+        Returns:
+            logging.LogRecord: the same record
+        """
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        """Put a record on the queue following the full-queue policy
+
+        Args:
+            record (logging.LogRecord): record to enqueue
+        """
+        if self.policy == "block":
+            self.queue.put(record)
+            return
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class RedactingQueueListener(logging.handlers.QueueListener):
+    """Queue listener draining every pending record when stopped
+    """
+
+    def enqueue_sentinel(self) -> None:
+        """Wait for room instead of failing on a full queue
+        """
+        self.queue.put(self._sentinel)
+
+
+def get_logger(non_blocking: bool = False,
+               queue_size: int = LOG_QUEUE_SIZE,
+               policy: str = "block") -> logging.Logger:
+    """Create the user_data logger with a redacting stream handler
+
+    Args:
+        non_blocking (bool): format and write records on a background
+            thread, the caller only enqueues them
+        queue_size (int): maximum number of pending records
+        policy (str): "block" or "drop" when the queue is full
 
     Returns:
-        logging.Logger: _description_
+        logging.Logger: the configured logger
     """
     logger = logging.getLogger("user_data")
     logger.setLevel(logging.INFO)
@@ -70,7 +391,17 @@ def get_logger() -> logging.Logger:
     stream_handler = logging.StreamHandler()
     stream_handler.setFormatter(RedactingFormatter(PII_FIELDS))
 
-    logger.addHandler(stream_handler)
+    if not non_blocking:
+        logger.addHandler(stream_handler)
+        return logger
+
+    log_queue = queue.Queue(queue_size)
+    queue_handler = RedactingQueueHandler(log_queue, policy)
+    queue_handler.listener = RedactingQueueListener(
+        log_queue, stream_handler, respect_handler_level=True)
+    queue_handler.listener.start()
+    atexit.register(queue_handler.listener.stop)
+    logger.addHandler(queue_handler)
 
     return logger
 
@@ -96,19 +427,279 @@ def get_db() -> mysql.connector.connection.MySQLConnection:
     return connection
 
 
+class ConnectionPool:
+    """Bounded pool of database connections validated on checkout
+    """
+
+    def __init__(self, factory: Callable[[], Any] = get_db,
+                 size: int = None, timeout: float = None):
+        """Initialize the pool, connections are opened on demand
+
+        Args:
+            factory (Callable[[], Any]): opens a new connection
+            size (int): maximum number of open connections, defaults to
+                PERSONAL_DATA_DB_POOL_SIZE or DB_POOL_SIZE
+            timeout (float): seconds to wait for a free connection,
+                None waits forever
+        """
+        if size is None:
+            size = int(os.environ.get("PERSONAL_DATA_DB_POOL_SIZE",
+                                      DB_POOL_SIZE))
+        self.factory = factory
+        self.size = size
+        self.timeout = timeout
+        self._idle: List[Any] = []
+        self._open = 0
+        self._cond = threading.Condition()
+        self._counters = {"created": 0, "reused": 0,
+                          "discarded": 0, "waits": 0}
+
+    @staticmethod
+    def is_alive(connection: Any) -> bool:
+        """Check that a connection can still be used
+
+        Args:
+            connection (Any): connection to check
+
+        Returns:
+            bool: True if the connection answers
+        """
+        is_connected = getattr(connection, "is_connected", None)
+        if is_connected is not None:
+            return is_connected()
+        try:
+            cursor = connection.cursor()
+            cursor.execute("SELECT 1")
+            cursor.fetchall()
+            cursor.close()
+        except Exception:
+            return False
+        return True
+
+    @staticmethod
+    def reset(connection: Any) -> bool:
+        """Clear the state a borrower left on a connection: the rows of
+        a result it did not read and its open transaction
+
+        Args:
+            connection (Any): connection to reset
+
+        Returns:
+            bool: False if the connection could not be reset
+        """
+        try:
+            consume_results = getattr(connection, "consume_results", None)
+            if consume_results is not None:
+                consume_results()
+            rollback = getattr(connection, "rollback", None)
+            if rollback is not None:
+                rollback()
+        except Exception:
+            return False
+        return True
+
+    def acquire(self) -> Any:
+        """Check a connection out of the pool
+
+        Returns:
+            Any: an idle connection that passed validation, or a new one
+
+        Raises:
+            TimeoutError: no connection was released in time
+        """
+        while True:
+            with self._cond:
+                while not self._idle and self._open >= self.size:
+                    self._counters["waits"] += 1
+                    if not self._cond.wait(self.timeout):
+                        raise TimeoutError("no free database connection")
+                if not self._idle:
+                    self._open += 1
+                    connection = None
+                else:
+                    connection = self._idle.pop()
+
+            if connection is None:
+                try:
+                    connection = self.factory()
+                except BaseException:
+                    self._forget()
+                    raise
+                with self._cond:
+                    self._counters["created"] += 1
+                return connection
+            if self.is_alive(connection):
+                with self._cond:
+                    self._counters["reused"] += 1
+                return connection
+            self._discard(connection)
+
+    def release(self, connection: Any) -> None:
+        """Return a connection to the pool, reset, or close it when it
+        can not be reset
+
+        Args:
+            connection (Any): connection obtained from acquire
+        """
+        if not self.reset(connection):
+            self._discard(connection)
+            return
+        with self._cond:
+            self._idle.append(connection)
+            self._cond.notify()
+
+    @contextmanager
+    def connection(self) -> Iterator[Any]:
+        """Borrow a connection for the duration of a with block
+
+        Yields:
+            Any: the borrowed connection
+        """
+        connection = self.acquire()
+        try:
+            yield connection
+        finally:
+            self.release(connection)
+
+    def close(self) -> None:
+        """Close every idle connection
+        """
+        with self._cond:
+            idle, self._idle = self._idle, []
+        for connection in idle:
+            self._discard(connection)
+
+    @property
+    def stats(self) -> Dict[str, int]:
+        """Pool usage counters and current occupancy
+        """
+        with self._cond:
+            stats = dict(self._counters)
+            stats.update(size=self.size, open=self._open,
+                         idle=len(self._idle),
+                         in_use=self._open - len(self._idle))
+        return stats
+
+    def _discard(self, connection: Any) -> None:
+        """Close a connection and free its slot
+        """
+        try:
+            connection.close()
+        except Exception:
+            pass
+        with self._cond:
+            self._counters["discarded"] += 1
+        self._forget()
+
+    def _forget(self) -> None:
+        """Free the slot of a connection that is no longer open
+        """
+        with self._cond:
+            self._open -= 1
+            self._cond.notify()
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_db_pool() -> ConnectionPool:
+    """Get the process wide pool of get_db connections
+
+    Returns:
+        ConnectionPool: pool sized by PERSONAL_DATA_DB_POOL_SIZE
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ConnectionPool(get_db)
+        return _pool
+
+
+class ThroughputCounter:
+    """Count exported rows and report the export rate
+    """
+
+    def __init__(self):
+        """Start counting from now
+        """
+        self.rows = 0
+        self.batches = 0
+        self._start = time.perf_counter()
+
+    def add(self, rows: int) -> None:
+        """Record one exported batch
+
+        Args:
+            rows (int): number of rows in the batch
+        """
+        self.rows += rows
+        self.batches += 1
+
+    @property
+    def elapsed(self) -> float:
+        """Seconds since the counter was created
+        """
+        return time.perf_counter() - self._start
+
+    @property
+    def rate(self) -> float:
+        """Exported rows per second
+        """
+        elapsed = self.elapsed
+        return self.rows / elapsed if elapsed > 0 else 0.0
+
+
+def export_users(handler: logging.StreamHandler,
+                 batch_size: int = None) -> ThroughputCounter:
+    """Stream the users table to a handler in redacted batches
+
+    Rows are read with an unbuffered cursor so the result set is never
+    held in memory, on a connection borrowed from get_db_pool, and each
+    batch is written with a single write.
+
+    Args:
+        handler (logging.StreamHandler): handler whose RedactingFormatter
+            and stream are used for the export
+        batch_size (int): rows fetched per batch, defaults to
+            PERSONAL_DATA_EXPORT_BATCH_SIZE or EXPORT_BATCH_SIZE
+
+    Returns:
+        ThroughputCounter: rows and batches exported, with the rate
+    """
+    if batch_size is None:
+        batch_size = int(os.environ.get("PERSONAL_DATA_EXPORT_BATCH_SIZE",
+                                        EXPORT_BATCH_SIZE))
+    formatter = handler.formatter
+    counter = ThroughputCounter()
+    with get_db_pool().connection() as db:
+        cursor = db.cursor(dictionary=True, buffered=False)
+        try:
+            cursor.execute("SELECT * FROM users;")
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                block = formatter.format_batch(
+                    "user_data", logging.INFO,
+                    ('; '.join(f"{k}={v}" for k, v in row.items())
+                     for row in rows))
+                handler.acquire()
+                try:
+                    handler.stream.write(block)
+                    handler.flush()
+                finally:
+                    handler.release()
+                counter.add(len(rows))
+        finally:
+            cursor.close()
+    return counter
+
+
 def main():
     """Retrieve and display all rows from the users table."""
     logger = get_logger()
-    db = get_db()
-    cursor = db.cursor(dictionary=True)
-    cursor.execute("SELECT * FROM users;")
-
-    for row in cursor:
-        filtered_row = '; '.join(f"{k}={v}" for k, v in row.items())
-        logger.info(filtered_row)
-
-    cursor.close()
-    db.close()
+    export_users(logger.handlers[0])
 
 
 if __name__ == "__main__":
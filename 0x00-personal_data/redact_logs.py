@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""Redact existing log files in parallel with the RedactingFormatter rules."""
+
+
+import argparse
+import mmap
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterator, Sequence, Tuple
+
+from filtered_logger import PII_FIELDS, RedactingFormatter, RedactionEngine
+
+CHUNK_SIZE = 16 * 1024 * 1024
+
+_engine = RedactionEngine()
+
+
+def split_lines(path: str, chunk_size: int) -> Iterator[Tuple[int, int]]:
+    """Split a file in chunks ending on line boundaries
+
+    Args:
+        path (str): file to split
+        chunk_size (int): approximate size of each chunk in bytes
+
+    Yields:
+        Tuple[int, int]: start and end offsets of each chunk
+    """
+    size = os.path.getsize(path)
+    if size == 0:
+        return
+    with open(path, 'rb') as f, \
+            mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        start = 0
+        while start < size:
+            end = mm.find(b"\n", min(start + chunk_size, size) - 1)
+            end = size if end == -1 else end + 1
+            yield start, end
+            start = end
+
+
+def redact_chunk(path: str, start: int, end: int, fields: Sequence[str],
+                 redaction: str, separator: str) -> bytes:
+    """Redact one chunk of a log file
+
+    Args:
+        path (str): log file, mapped again by the worker process
+        start (int): offset of the first byte of the chunk
+        end (int): offset following the last byte of the chunk
+        fields (Sequence[str]): names of the fields to redact
+        redaction (str): replacement for the field values
+        separator (str): character separating the fields
+
+    Returns:
+        bytes: the redacted chunk
+    """
+    with open(path, 'rb') as f, \
+            mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        text = mm[start:end].decode('utf-8', 'surrogateescape')
+    redacted = _engine.redact_block(fields, redaction, (text,), separator)
+    return redacted.encode('utf-8', 'surrogateescape')
+
+
+def redact_file(src: str, dst: str, fields: Sequence[str] = PII_FIELDS,
+                redaction: str = RedactingFormatter.REDACTION,
+                separator: str = RedactingFormatter.SEPARATOR,
+                workers: int = None, chunk_size: int = CHUNK_SIZE) -> float:
+    """Redact a log file across a process pool, keeping the line order
+
+    Args:
+        src (str): log file to redact
+        dst (str): file receiving the redacted lines
+        fields (Sequence[str]): names of the fields to redact
+        redaction (str): replacement for the field values
+        separator (str): character separating the fields
+        workers (int): number of processes, defaults to the CPU count
+        chunk_size (int): approximate size of each chunk in bytes
+
+    Returns:
+        float: throughput in MB/s
+    """
+    workers = workers or os.cpu_count() or 1
+    fields = tuple(fields)
+    begin = time.perf_counter()
+    pending = deque()
+    with ProcessPoolExecutor(workers) as executor, open(dst, 'wb') as out:
+        for start, end in split_lines(src, chunk_size):
+            pending.append(executor.submit(
+                redact_chunk, src, start, end, fields, redaction, separator))
+            if len(pending) >= 2 * workers:
+                out.write(pending.popleft().result())
+        while pending:
+            out.write(pending.popleft().result())
+    elapsed = time.perf_counter() - begin
+    megabytes = os.path.getsize(src) / (1024 * 1024)
+    return megabytes / elapsed if elapsed > 0 else 0.0
+
+
+def main():
+    """Parse the command line and redact the given log file."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("src", help="log file to redact")
+    parser.add_argument("dst", help="redacted output file")
+    parser.add_argument("-f", "--fields", default=",".join(PII_FIELDS),
+                        help="comma separated fields to redact")
+    parser.add_argument("-r", "--redaction",
+                        default=RedactingFormatter.REDACTION)
+    parser.add_argument("-s", "--separator",
+                        default=RedactingFormatter.SEPARATOR)
+    parser.add_argument("-w", "--workers", type=int, default=None)
+    parser.add_argument("-c", "--chunk-size", type=int, default=CHUNK_SIZE,
+                        help="approximate chunk size in bytes")
+    args = parser.parse_args()
+
+    rate = redact_file(args.src, args.dst, args.fields.split(","),
+                       args.redaction, args.separator, args.workers,
+                       args.chunk_size)
+    print(f"{rate:.2f} MB/s", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
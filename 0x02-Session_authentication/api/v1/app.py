@@ -3,6 +3,7 @@
 Route module for the API
 """
 from os import getenv
+from api.v1.auth.auth import PathMatcher
 from api.v1.views import app_views
 from flask import Flask, jsonify, abort, request
 from flask_cors import (CORS, cross_origin)
@@ -13,6 +14,11 @@ app.register_blueprint(app_views)
 app.config["JSONIFY_PRETTYPRINT_REGULAR"] = True
 CORS(app, resources={r"/api/v1/*": {"origins": "*"}})
 auth = None
+# Paths served without authentication, compiled once
+EXCLUDED_PATHS = PathMatcher(('/api/v1/status/',
+                              '/api/v1/unauthorized/',
+                              '/api/v1/forbidden/',
+                              '/api/v1/auth_session/login/'))
 # Check authentication type
 auth_type = getenv('AUTH_TYPE')
 if auth_type == 'auth':
@@ -61,10 +67,7 @@ def before_request():
     if not auth:
         return
     # Check if path doesn't require authorization
-    if not auth.require_auth(request.path, ['/api/v1/status/',
-                                            '/api/v1/unauthorized/',
-                                            '/api/v1/forbidden/',
-                                            '/api/v1/auth_session/login/']):
+    if not auth.require_auth(request.path, EXCLUDED_PATHS):
         return
 
     # Check for existence of an authentication scheme
@@ -3,8 +3,64 @@
 Authentication module for API
 """
 from flask import request
-from typing import Any, List, TypeVar, Optional
+from functools import lru_cache
+from typing import Any, Iterable, Iterator, List, TypeVar, Optional, Tuple
 from os import getenv
+import re
+
+
+# Decisions remembered per matcher, for paths seen before
+MATCH_CACHE_SIZE = int(getenv("AUTH_MATCH_CACHE_SIZE", "4096"))
+
+
+class PathMatcher:
+    """ Excluded paths compiled into one regular expression
+
+    Like before, a path matches when it starts with an excluded path,
+    once both end with a slash. A `*` matches any part of one path
+    segment: `/api/v1/stat*` covers `/api/v1/status` and `/api/v1/stats`,
+    `/api/v1/users/*/public/` the public route of every user. Decisions
+    are memoized per path.
+    """
+
+    def __init__(self, excluded_paths: Iterable[str],
+                 cache_size: int = None):
+        """ Compile the excluded paths
+        """
+        self.excluded_paths = tuple(excluded_paths)
+        self._regex = None
+        if self.excluded_paths:
+            self._regex = re.compile("|".join(
+                "[^/]*".join(map(re.escape, excluded_path.split("*")))
+                for excluded_path in self.excluded_paths))
+        if cache_size is None:
+            cache_size = MATCH_CACHE_SIZE
+        self.matches = lru_cache(maxsize=cache_size)(self._matches)
+
+    def _matches(self, path: str) -> bool:
+        """ Check if a path is excluded
+        """
+        if self._regex is None:
+            return False
+        path = path if path.endswith('/') else path + '/'
+        return self._regex.match(path) is not None
+
+    def __iter__(self) -> Iterator[str]:
+        """ Iterate over the excluded paths
+        """
+        return iter(self.excluded_paths)
+
+    def __len__(self) -> int:
+        """ Number of excluded paths
+        """
+        return len(self.excluded_paths)
+
+
+@lru_cache(maxsize=32)
+def compile_paths(excluded_paths: Tuple[str, ...]) -> PathMatcher:
+    """ Matcher of a list of excluded paths, compiled once per list
+    """
+    return PathMatcher(excluded_paths)
 
 
 class Auth:
@@ -13,17 +69,16 @@ class Auth:
     """
     def require_auth(self, path: str, excluded_paths: List[str]) -> bool:
         """ Check if authentication is required to access path
+            excluded_paths is a list of paths or a compiled PathMatcher
             Return:
                 - True if path requires authentication
                 - False if path doesn't need authentication
         """
         if not excluded_paths or not path:
             return True
-        path = path if path.endswith('/') else path + '/'
-        for excluded_path in excluded_paths:
-            if path.startswith(excluded_path.strip("*")):
-                return False
-        return True
+        if not isinstance(excluded_paths, PathMatcher):
+            excluded_paths = compile_paths(tuple(excluded_paths))
+        return not excluded_paths.matches(path)
 
     def authorization_header(self, request=None) -> Optional[str]:
         """ Check for authorization header in request
@@ -6,13 +6,86 @@ Basic authentication module
 import binascii
 from api.v1.auth.auth import Auth
 from base64 import b64decode
+from collections import OrderedDict
 from models.user import User
+from os import getenv
 from typing import Optional, Tuple, TypeVar
+import hashlib
+import hmac
+import os
+import threading
+import time
+
+
+# Verified Authorization headers kept, and for how many seconds
+CACHE_SIZE = int(getenv("BASIC_AUTH_CACHE_SIZE", "1024"))
+CACHE_TTL = float(getenv("BASIC_AUTH_CACHE_TTL", "300"))
 
 
 class BasicAuth(Auth):
     """ Basic authentication class
+
+    Verified Authorization headers are cached, keyed by their HMAC under
+    a per-process key, with the user they authenticate. A hit is only
+    used while the user is stored with the same password and update
+    time, so a changed or removed user is verified again.
     """
+    def __init__(self, cache_size: int = None, cache_ttl: float = None):
+        """ Initialize the verified credentials cache
+        """
+        self.cache_size = CACHE_SIZE if cache_size is None else cache_size
+        self.cache_ttl = CACHE_TTL if cache_ttl is None else cache_ttl
+        self._cache_key = os.urandom(32)
+        # header HMAC -> (user id, password, updated_at, expiry time)
+        self._cache = OrderedDict()
+        self._cache_lock = threading.Lock()
+
+    def _header_key(self, authorization_header: str) -> bytes:
+        """ Keyed hash of an Authorization header
+        """
+        return hmac.new(self._cache_key, authorization_header.encode(),
+                        hashlib.sha256).digest()
+
+    def cached_user(self, authorization_header: str) -> TypeVar('User'):
+        """ User of an Authorization header verified before
+            Return:
+                - User object if the header is cached and still valid
+                - None otherwise
+        """
+        if self.cache_size <= 0 or type(authorization_header) is not str:
+            return None
+        key = self._header_key(authorization_header)
+        with self._cache_lock:
+            entry = self._cache.get(key)
+            if entry is None:
+                return None
+            if entry[3] <= time.monotonic():
+                del self._cache[key]
+                return None
+            self._cache.move_to_end(key)
+        user_id, password, updated_at, _ = entry
+        user = User.get(user_id)
+        if user is None or user.password != password or \
+                user.updated_at != updated_at:
+            with self._cache_lock:
+                self._cache.pop(key, None)
+            return None
+        return user
+
+    def cache_user(self, authorization_header: str, user: TypeVar('User')):
+        """ Remember the user verified for an Authorization header
+        """
+        if self.cache_size <= 0:
+            return
+        key = self._header_key(authorization_header)
+        entry = (user.id, user.password, user.updated_at,
+                 time.monotonic() + self.cache_ttl)
+        with self._cache_lock:
+            self._cache[key] = entry
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
     def extract_base64_authorization_header(self,
                                             authorization_header: str) \
             -> Optional[str]:
@@ -90,8 +163,13 @@ class BasicAuth(Auth):
                 - User object associated with valid credentials
         """
         auth_header = self.authorization_header(request)
+        user = self.cached_user(auth_header)
+        if user is not None:
+            return user
         b64_str = self.extract_base64_authorization_header(auth_header)
         decode_b64_str = self.decode_base64_authorization_header(b64_str)
         email, pwd = self.extract_user_credentials(decode_b64_str)
         user = self.user_object_from_credentials(email, pwd)
+        if user is not None:
+            self.cache_user(auth_header, user)
         return user
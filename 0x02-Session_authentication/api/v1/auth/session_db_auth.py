@@ -5,12 +5,42 @@ Session storage module
 from api.v1.auth.session_exp_auth import SessionExpAuth
 from datetime import datetime, timedelta
 from models.user_session import UserSession
+from os import getenv
+from typing import Dict
+import atexit
+import threading
+import time
 
 
 class SessionDBAuth(SessionExpAuth):
     """ Session class for storable and persistent
         sessions
+
+    With SESSION_SLIDING=1 a session expires SESSION_DURATION seconds
+    after its last use instead of its last save. Uses are recorded in
+    memory; a session is saved again only once less than
+    SESSION_TOUCH_THRESHOLD of its stored lifetime is left, together
+    with the other sessions to save, every SESSION_TOUCH_INTERVAL
+    seconds or SESSION_TOUCH_BATCH sessions.
     """
+    # Last use of the sessions, and the uses waiting to be saved
+    _last_access: Dict[str, datetime] = {}
+    _touched: Dict[str, datetime] = {}
+    _touch_lock = threading.Lock()
+    _last_flush = time.monotonic()
+
+    def __init__(self) -> None:
+        """ Initialize SessionDBAuth instance
+        """
+        super().__init__()
+        self.sliding = getenv('SESSION_SLIDING', '') not in ('', '0')
+        self.touch_threshold = float(getenv('SESSION_TOUCH_THRESHOLD',
+                                            '0.5'))
+        self.touch_interval = float(getenv('SESSION_TOUCH_INTERVAL', '5'))
+        self.touch_batch = int(getenv('SESSION_TOUCH_BATCH', '100'))
+        if self.sliding:
+            atexit.register(self.flush_touches)
+
     def create_session(self, user_id: str = None) -> str:
         """ Creates session object
             Return:
@@ -43,14 +73,70 @@ class SessionDBAuth(SessionExpAuth):
             return session.user_id
 
         # Check for expired session
-        expiry_date = session.updated_at \
-            + timedelta(seconds=self.session_duration)
-        if datetime.utcnow() < expiry_date:
+        now = datetime.utcnow()
+        last_access = session.updated_at
+        if self.sliding:
+            last_access = max(last_access, SessionDBAuth._last_access.get(
+                session_id, last_access))
+        expiry_date = last_access + timedelta(seconds=self.session_duration)
+        if now < expiry_date:
+            if self.sliding:
+                self._touch(session, now)
             return session.user_id
-        SessionDBAuth.user_id_by_session_id.pop(session_id)
+        SessionDBAuth.user_id_by_session_id.pop(session_id, None)
+        self._forget(session_id)
         session.remove()
         return None
 
+    def _touch(self, session: UserSession, now: datetime):
+        """ Record a use of a session, queue its save when its stored
+            lifetime runs low, save the queue when it is due
+        """
+        duration = timedelta(seconds=self.session_duration)
+        with SessionDBAuth._touch_lock:
+            SessionDBAuth._last_access[session.session_id] = now
+            if session.updated_at + duration - now < \
+                    duration * self.touch_threshold:
+                SessionDBAuth._touched[session.session_id] = now
+            due = SessionDBAuth._touched and \
+                (len(SessionDBAuth._touched) >= self.touch_batch or
+                 time.monotonic() - SessionDBAuth._last_flush >=
+                 self.touch_interval)
+        if due:
+            self.flush_touches()
+
+    def flush_touches(self):
+        """ Save the queued sessions still stored in one batch, and
+            forget the uses of sessions expired since
+        """
+        with SessionDBAuth._touch_lock:
+            touched, SessionDBAuth._touched = SessionDBAuth._touched, {}
+            SessionDBAuth._last_flush = time.monotonic()
+            oldest = datetime.utcnow() - \
+                timedelta(seconds=self.session_duration)
+            for session_id, last_access in \
+                    list(SessionDBAuth._last_access.items()):
+                if last_access < oldest:
+                    del SessionDBAuth._last_access[session_id]
+        if not touched:
+            return
+        with UserSession.batch():
+            for session_id in touched:
+                try:
+                    sessions = UserSession.search({"session_id": session_id})
+                except KeyError:
+                    continue
+                for session in sessions:
+                    # Not saved back when logged out since the search
+                    session.save_if_stored()
+
+    def _forget(self, session_id: str):
+        """ Drop the recorded uses of a session
+        """
+        with SessionDBAuth._touch_lock:
+            SessionDBAuth._last_access.pop(session_id, None)
+            SessionDBAuth._touched.pop(session_id, None)
+
     def destroy_session(self, request=None) -> bool:
         """ Destroy session object based on session id
         """
@@ -64,7 +150,9 @@ class SessionDBAuth(SessionExpAuth):
 
         if sessions:
             session = sessions[0]
-            SessionDBAuth.user_id_by_session_id.pop(session.session_id)
+            SessionDBAuth.user_id_by_session_id.pop(
+                session.session_id, None)
+            self._forget(session.session_id)
             session.remove()
             return True
         return False
@@ -4,12 +4,29 @@ Expiring session module
 """
 from api.v1.auth.session_auth import SessionAuth
 from datetime import datetime, timedelta
+from heapq import heappop, heappush
 from os import getenv
+from typing import Dict, List, Optional, Tuple
+import threading
+import time
 
 
 class SessionExpAuth(SessionAuth):
     """ Expiring session class
+
+    Expiry dates of the created sessions are kept in a min-heap. Expired
+    sessions are removed from user_id_by_session_id when they are
+    looked up, when sessions are created and, with
+    SESSION_EVICT_INTERVAL set, by a background thread. Heap entries of
+    sessions destroyed or extended meanwhile are skipped when popped.
     """
+    # (expiry date, session id) of the sessions created here
+    _expiries: List[Tuple[datetime, str]] = []
+    _expiry_lock = threading.Lock()
+    _evictor: Optional[threading.Thread] = None
+    # Number of sessions removed once expired
+    expired_count = 0
+
     def __init__(self) -> None:
         """ Initialize SessionExpAuth instance
         """
@@ -23,6 +40,12 @@ class SessionExpAuth(SessionAuth):
                 self.session_duration = duration
             except ValueError:
                 self.session_duration = 0
+        try:
+            interval = float(getenv('SESSION_EVICT_INTERVAL', '0'))
+        except ValueError:
+            interval = 0
+        if interval > 0 and self.session_duration > 0:
+            self._start_evictor(interval)
 
     def create_session(self, user_id: str = None) -> str:
         """ Gets session_id from parent class method
@@ -39,6 +62,9 @@ class SessionExpAuth(SessionAuth):
         created_at = datetime.now()
         session_dict = {"user_id": user_id, "created_at": created_at}
         SessionExpAuth.user_id_by_session_id.update({session_id: session_dict})
+        if self.session_duration > 0:
+            self.schedule_expiry(session_id, created_at)
+            self.evict_expired(created_at)
         return session_id
 
     def user_id_for_session_id(self, session_id: str = None) -> str:
@@ -48,6 +74,8 @@ class SessionExpAuth(SessionAuth):
         """
         if not session_id and type(session_id) is not str:
             return None
+        if self.session_duration > 0:
+            self.evict_expired()
         session_info = SessionExpAuth.user_id_by_session_id.get(session_id)
         if not session_info:
             return None
@@ -65,3 +93,67 @@ class SessionExpAuth(SessionAuth):
         if datetime.now() > expiry_date:
             return None
         return user_id
+
+    def schedule_expiry(self, session_id: str, start: datetime):
+        """ Add the expiry of a session lasting from start to the heap
+        """
+        expiry_date = start + timedelta(seconds=self.session_duration)
+        with SessionExpAuth._expiry_lock:
+            heappush(SessionExpAuth._expiries, (expiry_date, session_id))
+
+    def _is_expired(self, session_info: dict, now: datetime) -> bool:
+        """ Check if a stored session is expired
+        """
+        created_at = session_info.get("created_at")
+        return created_at is not None and \
+            now > created_at + timedelta(seconds=self.session_duration)
+
+    def evict_expired(self, now: datetime = None) -> int:
+        """ Remove the sessions expired at now, in O(log n) each
+            Return:
+                - number of sessions removed
+        """
+        if now is None:
+            now = datetime.now()
+        sessions = SessionExpAuth.user_id_by_session_id
+        expiries = SessionExpAuth._expiries
+        evicted = 0
+        with SessionExpAuth._expiry_lock:
+            while expiries and expiries[0][0] < now:
+                _, session_id = heappop(expiries)
+                session_info = sessions.get(session_id)
+                if type(session_info) is dict and \
+                        self._is_expired(session_info, now):
+                    del sessions[session_id]
+                    evicted += 1
+            SessionExpAuth.expired_count += evicted
+        return evicted
+
+    @classmethod
+    def metrics(cls) -> Dict[str, int]:
+        """ Session counts
+            Return:
+                - live: sessions stored, expired or not yet removed
+                - expired: sessions removed once expired
+                - scheduled: expiry heap entries, stale ones included
+        """
+        return {"live": len(cls.user_id_by_session_id),
+                "expired": SessionExpAuth.expired_count,
+                "scheduled": len(SessionExpAuth._expiries)}
+
+    def _start_evictor(self, interval: float):
+        """ Start the background eviction thread once
+        """
+        with SessionExpAuth._expiry_lock:
+            if SessionExpAuth._evictor is not None:
+                return
+            SessionExpAuth._evictor = threading.Thread(
+                target=self._evict_loop, args=(interval,), daemon=True)
+            SessionExpAuth._evictor.start()
+
+    def _evict_loop(self, interval: float):
+        """ Remove the expired sessions every interval seconds
+        """
+        while True:
+            time.sleep(interval)
+            self.evict_expired()
@@ -15,10 +15,12 @@ from api.v1.auth.session_db_auth import SessionDBAuth
 # Reloading users
 User.load_from_file()
 
-# Reloading sessions
+# Reloading sessions, lazy class files and storage engines are not walked
+# at startup
 UserSession.load_from_file()
 try:
-    for session in UserSession.all():
-        SessionDBAuth.user_id_by_session_id[session.id] = session.user_id
+    if not UserSession.lazy and UserSession.storage is None:
+        for session in UserSession.all():
+            SessionDBAuth.user_id_by_session_id[session.id] = session.user_id
 except KeyError:
     pass
@@ -2,18 +2,108 @@
 """ Module of Users views
 """
 from api.v1.views import app_views
-from flask import abort, jsonify, request
+from flask import Response, abort, jsonify, request, stream_with_context
 from models.user import User
+from os import getenv
+from typing import Iterable, Iterator, List, Optional, Tuple
+import json
+
+
+# Users encoded per chunk of a streamed listing
+STREAM_CHUNK_SIZE = int(getenv("USERS_STREAM_CHUNK_SIZE", "500"))
+# Attributes the listing can be filtered on, through User.search
+FILTER_ATTRIBUTES = ("email", "first_name", "last_name")
+
+
+def _project(user: User, fields: Optional[List[str]]) -> dict:
+    """ JSON representation of a user, reduced to fields when given
+    """
+    user_json = user.to_json()
+    if fields is None:
+        return user_json
+    return {field: user_json[field] for field in fields
+            if field in user_json}
+
+
+def _page(filters: dict, start: int, limit: Optional[int]) \
+        -> Tuple[Iterable[User], Optional[str]]:
+    """ Users of a page of the listing, with the cursor of the next page
+    """
+    stop = None if limit is None else start + limit + 1
+    if filters:
+        # Searched on the indexed attributes first, email
+        users = User.search(filters)[start:stop]
+    else:
+        # Users removed since their IDs were read are skipped
+        users = (user for user in map(User.get, User.ids(start, stop))
+                 if user is not None)
+    if limit is None:
+        return users, None
+    # The page was read with one more user, telling if there is a next
+    users = list(users)
+    if len(users) <= limit:
+        return users, None
+    return users[:limit], str(start + limit)
+
+
+def _stream_users(users: Iterable[User],
+                  fields: Optional[List[str]]) -> Iterator[str]:
+    """ Yield a JSON array of users, a chunk of users at a time
+    """
+    yield "["
+    separator = ""
+    chunk = []
+    for user in users:
+        chunk.append(json.dumps(_project(user, fields)))
+        if len(chunk) >= STREAM_CHUNK_SIZE:
+            yield separator + ",".join(chunk)
+            separator = ","
+            chunk = []
+    if chunk:
+        yield separator + ",".join(chunk)
+    yield "]\n"
 
 
 @app_views.route('/users', methods=['GET'], strict_slashes=False)
 def view_all_users() -> str:
     """ GET /api/v1/users
+    Query parameters (optional):
+      - limit: maximum number of users returned
+      - cursor: value of the X-Next-Cursor header of the previous page
+      - stream: 1 to encode the response while it is sent
+      - fields: comma separated attributes returned for each user
+      - email, first_name, last_name: values the users must have
     Return:
-      - list of all User objects JSON represented
+      - list of all User objects JSON represented, with the cursor of
+        the next page in the X-Next-Cursor header
+      - 400 if limit or cursor is invalid
     """
-    all_users = [user.to_json() for user in User.all()]
-    return jsonify(all_users)
+    limit = request.args.get("limit")
+    cursor = request.args.get("cursor", "0")
+    stream = request.args.get("stream", "") not in ("", "0")
+    fields = request.args.get("fields")
+    if fields is not None:
+        fields = [field for field in fields.split(",") if field]
+    filters = {attr: request.args[attr] for attr in FILTER_ATTRIBUTES
+               if attr in request.args}
+    try:
+        start = int(cursor)
+        limit = None if limit is None else int(limit)
+    except ValueError:
+        return jsonify({'error': "Wrong cursor or limit"}), 400
+    if start < 0 or (limit is not None and limit <= 0):
+        return jsonify({'error': "Wrong cursor or limit"}), 400
+
+    users, next_cursor = _page(filters, start, limit)
+    if stream:
+        response = Response(
+            stream_with_context(_stream_users(users, fields)),
+            mimetype="application/json")
+    else:
+        response = jsonify([_project(user, fields) for user in users])
+    if next_cursor is not None:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return response
 
 
 @app_views.route('/users/<user_id>', methods=['GET'], strict_slashes=False)
@@ -0,0 +1,36 @@
+#!/usr/bin/env python3
+""" Compare the memory held by sessions with and without MODELS_COMPACT
+"""
+import os
+import subprocess
+import sys
+
+
+def measure(count: int) -> int:
+    """ Bytes allocated by count sessions stored in DATA
+    """
+    import tracemalloc
+    from models.base import DATA
+    from models.user_session import UserSession
+
+    tracemalloc.start()
+    DATA["UserSession"] = {}
+    for _ in range(count):
+        session = UserSession(user_id="9d2c1b0e-9a4a-4d2b-8c8e-1f6b7a3c5d21")
+        DATA["UserSession"][session.id] = session
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return size
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 2 and sys.argv[1] == "--measure":
+        print(measure(int(sys.argv[2])))
+        sys.exit(0)
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    for compact in ("0", "1"):
+        env = dict(os.environ, MODELS_COMPACT=compact)
+        size = int(subprocess.check_output(
+            [sys.executable, __file__, "--measure", str(count)], env=env))
+        print("MODELS_COMPACT={}: {} sessions, {:.1f} MB, {} bytes each"
+              .format(compact, count, size / 1024 / 1024, size // count))
@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+""" Compare load time and file size of the json and binary formats
+"""
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+
+def run(count: int):
+    """ Store count users in json, convert them to binary and time the
+        loading of each file
+    """
+    from models.user import User
+
+    User.file_format = "json"
+    User.load_from_file()
+    with User.batch():
+        for i in range(count):
+            user = User(email="user{}@example.com".format(i),
+                        first_name="First{}".format(i),
+                        last_name="Last{}".format(i))
+            user.password = "pwd{}".format(i)
+            user.save()
+
+    for file_format in ("json", "binary"):
+        if file_format != User.file_format:
+            User.convert(file_format)
+        start = time.perf_counter()
+        User.load_from_file()
+        elapsed = time.perf_counter() - start
+        size = os.path.getsize(User._file_path())
+        print("{:>6}: {} users loaded in {:.3f}s, {:.1f} MB".format(
+            file_format, User.count(), elapsed, size / 1024 / 1024))
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    # Run in a scratch directory, the class files of the current one
+    # belong to the API
+    directory = tempfile.mkdtemp()
+    os.chdir(directory)
+    try:
+        run(count)
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
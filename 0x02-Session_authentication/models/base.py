@@ -1,27 +1,106 @@
 #!/usr/bin/env python3
 """ Base module
 """
+from contextlib import contextmanager
 from datetime import datetime
-from typing import TypeVar, List, Iterable
-from os import path
+from itertools import islice
+from models import binary_format, compact, journal, snapshot
+from models.lazy import LazyObjects
+from models.rwlock import RWLock
+from models.sqlite_storage import SQLiteStorage
+from models.storage import Storage
+from typing import Callable, Dict, Iterator, Optional, TypeVar, List, \
+    Iterable, Tuple
+from os import getenv, path
+import atexit
 import json
+import logging
+import threading
+import time
 import uuid
 
 
 TIMESTAMP_FORMAT = "%Y-%m-%dT%H:%M:%S"
+# "snapshot" rewrites the class file on each write, "journal" appends
+STORAGE_MODE = getenv("MODELS_STORAGE", "snapshot")
+COMPACT_INTERVAL = float(getenv("MODELS_COMPACT_INTERVAL", "60"))
+COMPACT_THRESHOLD = int(getenv("MODELS_COMPACT_THRESHOLD", "10000"))
+# Class file format: "json" or "binary" (models.binary_format)
+FILE_FORMAT = getenv("MODELS_FORMAT", "json")
+# Decode objects of binary class files on first access, keeping an LRU
+LAZY = getenv("MODELS_LAZY", "") not in ("", "0")
+LAZY_CACHE_SIZE = int(getenv("MODELS_LAZY_CACHE_SIZE", "10000"))
+# Slot-backed models without a per-instance __dict__ (models.compact)
+COMPACT = getenv("MODELS_COMPACT", "") not in ("", "0")
+# Keep the to_json dictionaries of each object until it is modified
+JSON_CACHE = getenv("MODELS_JSON_CACHE", "1") not in ("", "0")
+# Storage engine: "file" keeps the objects in DATA and the class files,
+# "sqlite" stores them in the MODELS_SQLITE_PATH database
+BACKEND = getenv("MODELS_BACKEND", "file")
+SQLITE_PATH = getenv("MODELS_SQLITE_PATH", ".db_models.sqlite3")
 DATA = {}
+# Errors of the background threads, which keep running
+_logger = logging.getLogger(__name__)
+# Journal records written since the last compaction, per class name
+JOURNAL_SIZES = {}
+# Classes with a journal, compacted by the background thread
+JOURNALED = {}
+# Guards DATA and the indexes: shared by searches, exclusive to the saves
+# and removes. Files are only written by the writer thread.
+LOCK = RWLock()
+_compact_event = threading.Event()
+_compactor = None
+# Group commit: flush every COMMIT_INTERVAL seconds or COMMIT_COUNT writes
+COMMIT_INTERVAL = float(getenv("MODELS_COMMIT_INTERVAL", "0"))
+COMMIT_COUNT = int(getenv("MODELS_COMMIT_COUNT", "0"))
+# Writes waiting for the next group commit, per class
+PENDING = {}
+_committer = None
+# Writes waiting for the writer thread, as a WriteTicket
+_write_ticket = None
+_write_cond = threading.Condition()
+_writer = None
+# Writes of the batches opened by the current thread
+_batches = threading.local()
+# Secondary indexes: class name -> attribute -> value -> ids (ordered set)
+INDEXES = {}
+# Indexed values of each stored object: class name -> id -> values
+INDEXED_VALUES = {}
+# Attribute names of the compact classes, in to_json order
+_ATTRIBUTE_NAMES = {}
+# to_json plans: (class, attribute names, for_serialization) -> plan
+_FIELD_PLANS = {}
+# Plan steps: format as a timestamp, or check the value type first
+_TIMESTAMP, _CHECK = range(2)
+_MISSING = object()
 
 
 class Base():
     """ Base class
     """
+    # Attributes looked up through a secondary index by `search`
+    indexed_attributes: Tuple[str, ...] = ()
+    storage_mode: str = STORAGE_MODE
+    file_format: str = FILE_FORMAT
+    lazy: bool = LAZY
+    # Engine replacing DATA and the class files, None for the file engine
+    storage: Optional[Storage] = \
+        SQLiteStorage(SQLITE_PATH) if BACKEND == "sqlite" else None
+    # Attributes always holding a datetime
+    timestamp_attributes: Tuple[str, ...] = ("created_at", "updated_at")
+    if COMPACT:
+        __slots__ = ("id", "_created_us", "_updated_us", "_json_cache")
+        created_at = compact.TimestampField("_created_us")
+        updated_at = compact.TimestampField("_updated_us")
+    else:
+        # The cache lives outside __dict__, which is what gets serialized
+        __slots__ = ("__dict__", "__weakref__", "_json_cache")
 
     def __init__(self, *args: list, **kwargs: dict):
         """ Initialize a Base instance
         """
         s_class = str(self.__class__.__name__)
-        if DATA.get(s_class) is None:
-            DATA[s_class] = {}
+        DATA.setdefault(s_class, {})
 
         self.id = kwargs.get('id', str(uuid.uuid4()))
         if kwargs.get('created_at') is not None:
@@ -44,70 +123,480 @@ class Base():
             return False
         return (self.id == other.id)
 
+    def __setattr__(self, name: str, value):
+        """ Set an attribute and drop the cached to_json dictionaries
+        """
+        object.__setattr__(self, name, value)
+        object.__setattr__(self, "_json_cache", None)
+
     def to_json(self, for_serialization: bool = False) -> dict:
         """ Convert the object a JSON dictionary
+
+        The result is cached until the object is modified, callers get
+        their own copy.
         """
+        try:
+            cache = self._json_cache
+        except AttributeError:
+            cache = None
+        if cache is not None and for_serialization in cache:
+            return dict(cache[for_serialization])
+
+        attributes = self._attributes()
         result = {}
-        for key, value in self.__dict__.items():
-            if not for_serialization and key[0] == '_':
-                continue
-            if type(value) is datetime:
-                result[key] = value.strftime(TIMESTAMP_FORMAT)
+        for step, key in self.__class__._field_plan(tuple(attributes),
+                                                    for_serialization):
+            value = attributes[key]
+            if step == _TIMESTAMP or \
+                    (step == _CHECK and type(value) is datetime):
+                result[key] = _format_timestamp(value)
             else:
                 result[key] = value
+        if JSON_CACHE:
+            if cache is None:
+                cache = {}
+                object.__setattr__(self, "_json_cache", cache)
+            cache[for_serialization] = result
+            return dict(result)
+        return result
+
+    @classmethod
+    def _field_plan(cls, names: Tuple[str, ...], for_serialization: bool) \
+            -> Tuple[Tuple[int, str], ...]:
+        """ Steps of to_json for objects with these attribute names:
+            the kept attributes, with how to convert their value
+        """
+        key = (cls, names, for_serialization)
+        plan = _FIELD_PLANS.get(key)
+        if plan is None:
+            steps = []
+            for name in names:
+                if not for_serialization and name[0] == '_':
+                    continue
+                if name in cls.timestamp_attributes:
+                    steps.append((_TIMESTAMP, name))
+                else:
+                    steps.append((_CHECK, name))
+            plan = _FIELD_PLANS[key] = tuple(steps)
+        return plan
+
+    def _attributes(self) -> dict:
+        """ Attributes of the object, in to_json order
+        """
+        if not COMPACT:
+            return self.__dict__
+        result = {}
+        for name in self.__class__._attribute_names():
+            value = getattr(self, name, _MISSING)
+            if value is not _MISSING:
+                result[name] = value
         return result
 
+    @classmethod
+    def _attribute_names(cls) -> Tuple[str, ...]:
+        """ Attribute names of a compact class: the Base ones, then the
+            slots of each subclass
+        """
+        names = _ATTRIBUTE_NAMES.get(cls)
+        if names is None:
+            names = ("id", "created_at", "updated_at") + tuple(
+                slot for klass in reversed(cls.__mro__)
+                if klass is not Base and issubclass(klass, Base)
+                for slot in klass.__dict__.get("__slots__", ()))
+            _ATTRIBUTE_NAMES[cls] = names
+        return names
+
+    @classmethod
+    def _from_attributes(cls, attributes: dict) -> TypeVar('Base'):
+        """ Build an object from stored attributes, without __init__
+        """
+        obj = cls.__new__(cls)
+        object.__setattr__(obj, "_json_cache", None)
+        if COMPACT:
+            for name, value in attributes.items():
+                setattr(obj, name, value)
+        else:
+            obj.__dict__.update(attributes)
+        return obj
+
     @classmethod
     def load_from_file(cls):
-        """ Load all objects from file
+        """ Load all objects from file, then replay the journal
         """
-        s_class = cls.__name__
-        file_path = ".db_{}.json".format(s_class)
-        DATA[s_class] = {}
-        if not path.exists(file_path):
+        if cls.storage is not None:
+            cls.storage.load(cls)
             return
+        s_class = cls.__name__
+        file_path = cls._file_path()
+        flush()
+        with LOCK.write():
+            DATA[s_class] = {}
+            index_rows = None
+            if path.exists(file_path):
+                index_rows = cls._load_snapshot(file_path)
+            cls.reindex(index_rows)
 
+            replayed = 0
+            for record in journal.replay(cls._journal_path()):
+                if record["op"] == "save":
+                    obj = cls(**record["obj"])
+                    DATA[s_class][obj.id] = obj
+                    obj._index()
+                else:
+                    DATA[s_class].pop(record["id"], None)
+                    cls._unindex_id(record["id"])
+                replayed += 1
+            JOURNAL_SIZES[s_class] = replayed
+        if cls.storage_mode != "journal" and JOURNAL_SIZES[s_class]:
+            # Leftover journal from a previous run in journal mode
+            cls.compact()
+
+    @classmethod
+    def _load_snapshot(cls, file_path: str) \
+            -> Optional[Iterator[Tuple[str, dict]]]:
+        """ Fill DATA from the class file
+
+        Lazy binary files only load their index, whose (id, indexed
+        values) pairs are returned to build the secondary indexes.
+        """
+        s_class = cls.__name__
+        if cls.file_format == "binary" and cls.lazy:
+            DATA[s_class] = LazyObjects(cls, file_path, LAZY_CACHE_SIZE)
+            return DATA[s_class].index_rows
+        if cls.file_format == "binary":
+            # Attributes are stored typed, __init__ has nothing to parse
+            with open(file_path, 'rb') as f:
+                for row in binary_format.loads(f.read()):
+                    obj = cls._from_attributes(row)
+                    DATA[s_class][obj.id] = obj
+            return
         with open(file_path, 'r') as f:
             objs_json = json.load(f)
             for obj_id, obj_json in objs_json.items():
                 DATA[s_class][obj_id] = cls(**obj_json)
 
+    @classmethod
+    def reindex(cls, rows: Iterable[Tuple[str, dict]] = None):
+        """ Rebuild the secondary indexes from DATA, or from the given
+            (id, indexed values) pairs
+        """
+        s_class = cls.__name__
+        INDEXES[s_class] = {attr: {} for attr in cls.indexed_attributes}
+        INDEXED_VALUES[s_class] = {}
+        if not cls.indexed_attributes:
+            return
+        if rows is None:
+            rows = ((obj.id, obj._indexed_values())
+                    for obj in DATA.get(s_class, {}).values())
+        indexes = INDEXES[s_class]
+        indexed_values = INDEXED_VALUES[s_class]
+        for obj_id, values in rows:
+            indexed = {}
+            for attr, value in values.items():
+                try:
+                    indexes[attr].setdefault(value, {})[obj_id] = None
+                except TypeError:
+                    continue
+                indexed[attr] = value
+            indexed_values[obj_id] = indexed
+
+    def _indexed_values(self) -> dict:
+        """ Current values of the indexed attributes
+        """
+        return {attr: getattr(self, attr, None)
+                for attr in self.indexed_attributes}
+
+    def _index(self):
+        """ Add the current object to the secondary indexes
+        """
+        s_class = self.__class__.__name__
+        if not self.indexed_attributes:
+            return
+        if s_class not in INDEXES:
+            self.__class__.reindex()
+        self.__class__._index_id(self.id, self._indexed_values())
+
+    def _unindex(self):
+        """ Remove the current object from the secondary indexes
+        """
+        self.__class__._unindex_id(self.id)
+
+    @classmethod
+    def _index_id(cls, obj_id: str, values: dict):
+        """ Index an object id under its attribute values
+        """
+        s_class = cls.__name__
+        cls._unindex_id(obj_id)
+        indexed = {}
+        for attr, value in values.items():
+            try:
+                INDEXES[s_class][attr].setdefault(value, {})[obj_id] = None
+            except TypeError:
+                # Unhashable value: left out of the index
+                continue
+            indexed[attr] = value
+        INDEXED_VALUES[s_class][obj_id] = indexed
+
+    @classmethod
+    def _unindex_id(cls, obj_id: str):
+        """ Remove an object id from the secondary indexes
+        """
+        s_class = cls.__name__
+        values = INDEXED_VALUES.get(s_class, {}).pop(obj_id, {})
+        for attr, value in values.items():
+            ids = INDEXES[s_class][attr][value]
+            ids.pop(obj_id, None)
+            if not ids:
+                del INDEXES[s_class][attr][value]
+
     @classmethod
     def save_to_file(cls):
         """ Save all objects to file
+
+        Objects are serialized under the read lock, the file is written
+        after releasing it.
         """
         s_class = cls.__name__
-        file_path = ".db_{}.json".format(s_class)
-        objs_json = {}
-        for obj_id, obj in DATA[s_class].items():
-            objs_json[obj_id] = obj.to_json(True)
+        file_path = cls._file_path()
+        with LOCK.read():
+            start = time.perf_counter()
+            objs = DATA[s_class]
+            if cls.file_format == "binary":
+                data = binary_format.dumps(
+                    (obj._attributes() for obj in objs.values()),
+                    ("id",) + cls.indexed_attributes)
+            else:
+                objs_json = {}
+                for obj_id, obj in objs.items():
+                    objs_json[obj_id] = obj.to_json(True)
+                data = json.dumps(objs_json).encode()
+            serialize = time.perf_counter() - start
+            if isinstance(objs, LazyObjects):
+                if cls.file_format == "binary":
+                    # Reopening drops the objects saved since the
+                    # serialization, they must wait for it
+                    snapshot.write_atomic(file_path, data, serialize)
+                    objs.open(file_path)
+                    return
+                # Converted away from binary: only binary files are
+                # mapped, the objects are kept decoded
+                DATA[s_class] = dict(objs.items())
+        snapshot.write_atomic(file_path, data, serialize)
+
+    @classmethod
+    def convert(cls, file_format: str):
+        """ Rewrite the class file in another format and use it from now
+
+        The previous file is kept.
+        """
+        if cls.storage is not None:
+            raise ValueError("{} is not stored in class files"
+                             .format(cls.__name__))
+        cls.load_from_file()
+        with LOCK.write():
+            cls.file_format = file_format
+            ticket = _submit(calls=[cls.save_to_file])
+        ticket.wait()
+
+    @classmethod
+    def _file_path(cls) -> str:
+        """ Path of the class file in its format
+        """
+        extension = "bin" if cls.file_format == "binary" else "json"
+        return ".db_{}.{}".format(cls.__name__, extension)
+
+    @classmethod
+    def _journal_path(cls) -> str:
+        """ Path of the class journal
+        """
+        return ".db_{}.journal".format(cls.__name__)
 
-        with open(file_path, 'w') as f:
-            json.dump(objs_json, f)
+    @classmethod
+    @contextmanager
+    def batch(cls) -> Iterator[None]:
+        """ Coalesce the saves and removes of the block into one flush
+            per class, written when the outermost batch exits
+
+        Other threads may change the same objects before the batch
+        exits, so it writes the state of each object it touched at that
+        time rather than its own, older records.
+        """
+        if cls.storage is not None:
+            with cls.storage.batch():
+                yield
+            return
+        pending = getattr(_batches, "pending", None)
+        if pending is not None:
+            yield
+            return
+        _batches.pending = pending = {}
+        try:
+            yield
+        finally:
+            _batches.pending = None
+            with LOCK.write():
+                ticket = _submit({klass: klass._current_records(records)
+                                  for klass, records in pending.items()})
+            ticket.wait()
+
+    @classmethod
+    def _current_records(cls, records: List[dict]) -> List[dict]:
+        """ One record per object of records, with its current state:
+            a save if it is still stored, a remove otherwise
+
+        Called under the write lock.
+        """
+        objs = DATA.get(cls.__name__, {})
+        current = []
+        for obj_id in dict.fromkeys(record["id"] for record in records):
+            obj = objs.get(obj_id)
+            if obj is None:
+                current.append({"op": "remove", "id": obj_id})
+            else:
+                current.append({"op": "save", "id": obj_id,
+                                "obj": obj.to_json(True)})
+        return current
+
+    @classmethod
+    def _persist(cls, record: dict) -> Optional['WriteTicket']:
+        """ Hand one save or remove to the writer thread, now or with
+            its batch or group commit
+
+        Called under the write lock, so records written now or with the
+        group commit reach the writer in the order of the changes; a
+        batch replaces its records by the current state of the objects
+        when it exits. Returns the ticket to wait for, once the lock is
+        released, when the write is not deferred.
+        """
+        global PENDING
+        pending = getattr(_batches, "pending", None)
+        if pending is not None:
+            pending.setdefault(cls, []).append(record)
+            return None
+        if COMMIT_INTERVAL <= 0 and COMMIT_COUNT <= 0:
+            return _submit({cls: [record]})
+        PENDING.setdefault(cls, []).append(record)
+        _start_committer()
+        if COMMIT_COUNT > 0 and \
+                sum(map(len, PENDING.values())) >= COMMIT_COUNT:
+            pending, PENDING = PENDING, {}
+            _submit(pending)
+        return None
+
+    @classmethod
+    def _write(cls, records: List[dict]):
+        """ Write records of saves and removes already applied to DATA,
+            on the writer thread
+
+        Snapshot mode rewrites the class file once. Journal mode appends
+        the records, the snapshot is rewritten later by `compact`.
+        """
+        if cls.storage_mode != "journal":
+            cls.save_to_file()
+            return
+        s_class = cls.__name__
+        journal.append(cls._journal_path(), records)
+        JOURNAL_SIZES[s_class] = JOURNAL_SIZES.get(s_class, 0) + len(records)
+        JOURNALED[s_class] = cls
+        _start_compactor()
+        if JOURNAL_SIZES[s_class] >= COMPACT_THRESHOLD:
+            _compact_event.set()
+
+    @classmethod
+    def compact(cls):
+        """ Fold the journal into the class file and empty it
+        """
+        _submit(calls=[cls._compact]).wait()
+
+    @classmethod
+    def _compact(cls):
+        """ Compact the journal, on the writer thread
+        """
+        s_class = cls.__name__
+        if not JOURNAL_SIZES.get(s_class):
+            return
+        cls.save_to_file()
+        journal.truncate(cls._journal_path())
+        JOURNAL_SIZES[s_class] = 0
 
     def save(self):
         """ Save current object
         """
+        if self.storage is not None:
+            self.updated_at = datetime.utcnow()
+            self.storage.save(self)
+            return
+        s_class = self.__class__.__name__
+        with LOCK.write():
+            self.updated_at = datetime.utcnow()
+            DATA[s_class][self.id] = self
+            self._index()
+            ticket = self.__class__._persist({"op": "save", "id": self.id,
+                                              "obj": self.to_json(True)})
+        if ticket is not None:
+            ticket.wait()
+
+    def save_if_stored(self) -> bool:
+        """ Save current object only if it is still stored, so a remove
+            made since it was read is not undone
+
+        Returns whether it was saved.
+        """
+        if self.storage is not None:
+            self.updated_at = datetime.utcnow()
+            return self.storage.update(self)
         s_class = self.__class__.__name__
-        self.updated_at = datetime.utcnow()
-        DATA[s_class][self.id] = self
-        self.__class__.save_to_file()
+        with LOCK.write():
+            if DATA[s_class].get(self.id) is None:
+                return False
+            self.updated_at = datetime.utcnow()
+            DATA[s_class][self.id] = self
+            self._index()
+            ticket = self.__class__._persist({"op": "save", "id": self.id,
+                                              "obj": self.to_json(True)})
+        if ticket is not None:
+            ticket.wait()
+        return True
 
     def remove(self):
         """ Remove object
         """
+        if self.storage is not None:
+            self.storage.remove(self)
+            return
         s_class = self.__class__.__name__
-        if DATA[s_class].get(self.id) is not None:
-            del DATA[s_class][self.id]
-            self.__class__.save_to_file()
+        ticket = None
+        with LOCK.write():
+            if DATA[s_class].get(self.id) is not None:
+                del DATA[s_class][self.id]
+                self._unindex()
+                ticket = self.__class__._persist({"op": "remove",
+                                                  "id": self.id})
+        if ticket is not None:
+            ticket.wait()
+
+    # get and count are single dictionary operations, they need no lock
 
     @classmethod
     def count(cls) -> int:
         """ Count all objects
         """
+        if cls.storage is not None:
+            return cls.storage.count(cls)
         s_class = cls.__name__
         return len(DATA[s_class].keys())
 
+    @classmethod
+    def ids(cls, start: int = 0, stop: int = None) -> List[str]:
+        """ IDs of the objects from position start to stop, in storage
+            order
+        """
+        if cls.storage is not None:
+            return cls.storage.ids(cls, start, stop)
+        s_class = cls.__name__
+        with LOCK.read():
+            return list(islice(DATA[s_class], start, stop))
+
     @classmethod
     def all(cls) -> Iterable[TypeVar('Base')]:
         """ Return all objects
@@ -118,13 +607,21 @@ class Base():
     def get(cls, id: str) -> TypeVar('Base'):
         """ Return one object by ID
         """
+        if cls.storage is not None:
+            return cls.storage.get(cls, id)
         s_class = cls.__name__
         return DATA[s_class].get(id)
 
     @classmethod
     def search(cls, attributes: dict = {}) -> List[TypeVar('Base')]:
         """ Search all objects with matching attributes
+
+        When the query covers an indexed attribute, only the objects
+        indexed under its value are checked. Indexes reflect the objects
+        as of their last `save`.
         """
+        if cls.storage is not None:
+            return cls.storage.search(cls, attributes)
         s_class = cls.__name__
 
         def _search(obj):
@@ -136,4 +633,155 @@ class Base():
                     return False
             return True
 
-        return list(filter(_search, DATA[s_class].values()))
+        with LOCK.read():
+            objs = DATA[s_class]
+            candidates = objs.values()
+            for attr in cls.indexed_attributes:
+                # Not indexed before the first load or save: scanned
+                if attr not in attributes or s_class not in INDEXES:
+                    continue
+                try:
+                    ids = INDEXES[s_class][attr].get(attributes[attr], {})
+                except TypeError:
+                    continue
+                candidates = [objs[obj_id] for obj_id in ids]
+                break
+            return list(filter(_search, candidates))
+
+
+def _format_timestamp(value: datetime) -> str:
+    """ Format a datetime with TIMESTAMP_FORMAT
+    """
+    if value.tzinfo is None and value.year >= 1000:
+        # Same output as strftime(TIMESTAMP_FORMAT), in C
+        return value.isoformat(timespec="seconds")
+    return value.strftime(TIMESTAMP_FORMAT)
+
+
+class WriteTicket:
+    """ Writes handed together to the writer thread
+    """
+
+    def __init__(self):
+        """ Initialize an empty ticket
+        """
+        # Records of saves and removes per class, then other writes
+        self.records: Dict[type, List[dict]] = {}
+        self.calls: List[Callable[[], None]] = []
+        self.error: Optional[BaseException] = None
+        self._done = threading.Event()
+
+    def wait(self):
+        """ Wait until the writes are done, raise their error if any
+        """
+        self._done.wait()
+        if self.error is not None:
+            raise self.error
+
+
+def _submit(records: Dict[type, List[dict]] = None,
+            calls: Iterable[Callable[[], None]] = ()) -> WriteTicket:
+    """ Queue writes for the writer thread, together with the writes
+        still waiting for it
+    """
+    global _write_ticket, _writer
+    with _write_cond:
+        ticket = _write_ticket
+        if ticket is None:
+            ticket = _write_ticket = WriteTicket()
+            _write_cond.notify()
+        for cls, cls_records in (records or {}).items():
+            ticket.records.setdefault(cls, []).extend(cls_records)
+        ticket.calls.extend(calls)
+        if _writer is None:
+            _writer = threading.Thread(target=_writer_loop, daemon=True)
+            _writer.start()
+    return ticket
+
+
+def _writer_loop():
+    """ Write the queued tickets one at a time: the only thread writing
+        the class files and journals
+    """
+    global _write_ticket
+    while True:
+        with _write_cond:
+            while _write_ticket is None:
+                _write_cond.wait()
+            ticket, _write_ticket = _write_ticket, None
+        try:
+            _write_all(ticket.records)
+            for call in ticket.calls:
+                call()
+        except BaseException as e:
+            ticket.error = e
+        finally:
+            ticket._done.set()
+
+
+def _compact_loop():
+    """ Compact the journals every COMPACT_INTERVAL seconds, or sooner
+        when one reaches COMPACT_THRESHOLD records
+    """
+    while True:
+        _compact_event.wait(COMPACT_INTERVAL)
+        _compact_event.clear()
+        classes = list(JOURNALED.values())
+        try:
+            _submit(calls=[cls._compact for cls in classes]).wait()
+        except Exception:
+            # Retried at the next interval, the journal is still there
+            _logger.exception("journal compaction failed")
+
+
+def _start_compactor():
+    """ Start the background compaction thread once
+    """
+    global _compactor
+    if _compactor is None:
+        _compactor = threading.Thread(target=_compact_loop, daemon=True)
+        _compactor.start()
+
+
+def _write_all(pending: Dict[type, List[dict]]):
+    """ Write the pending records of each class
+    """
+    for cls, records in pending.items():
+        if records:
+            cls._write(records)
+
+
+def flush():
+    """ Write the records waiting for the group commit, and wait for
+        every write queued before
+    """
+    global PENDING
+    if not PENDING and _writer is None:
+        return
+    with LOCK.write():
+        pending, PENDING = PENDING, {}
+        ticket = _submit(pending)
+    ticket.wait()
+
+
+def _commit_loop():
+    """ Flush the group commit every COMMIT_INTERVAL seconds
+    """
+    while True:
+        time.sleep(COMMIT_INTERVAL)
+        try:
+            flush()
+        except Exception:
+            _logger.exception("group commit failed")
+
+
+def _start_committer():
+    """ Start the background group commit thread once, when timed
+    """
+    global _committer
+    if _committer is None and COMMIT_INTERVAL > 0:
+        _committer = threading.Thread(target=_commit_loop, daemon=True)
+        _committer.start()
+
+
+atexit.register(flush)
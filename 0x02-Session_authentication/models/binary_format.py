@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+""" Binary format module: compact length-prefixed snapshot encoding
+
+Layout, integers little endian:
+    b"MDB1"
+    u32 field count, then each field name as u16 length + UTF-8
+    u32 record count
+    records: u32 length, then per attribute u16 field number, u8 type
+    tag and the value
+    index: u16 field count and names, u32 record count, the u64 offset
+    of each record from the first one, then per index field a u32
+    length + JSON array of the values of each record
+    u64 offset of the index, b"MIX1"
+Datetimes are stored as microseconds since the epoch, so loading them
+needs no string parsing. The index lets a reader locate records by id
+without decoding them, it is read with a few bulk operations.
+"""
+from array import array
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+import json
+import struct
+import sys
+
+
+MAGIC = b"MDB1"
+INDEX_MAGIC = b"MIX1"
+EPOCH = datetime(1970, 1, 1)
+MICROSECOND = timedelta(microseconds=1)
+
+NONE, STR, INT, FLOAT, TRUE, FALSE, DATETIME, JSON = range(8)
+
+_u16 = struct.Struct("<H")
+_u32 = struct.Struct("<I")
+_u64 = struct.Struct("<Q")
+_i64 = struct.Struct("<q")
+_f64 = struct.Struct("<d")
+_attr = struct.Struct("<HB")
+
+
+def _encode_value(value: Any) -> bytes:
+    """ Encode one attribute value with its type tag
+    """
+    kind = type(value)
+    if value is None:
+        return bytes((NONE,))
+    if kind is str:
+        raw = value.encode()
+        return bytes((STR,)) + _u32.pack(len(raw)) + raw
+    if kind is bool:
+        return bytes((TRUE if value else FALSE,))
+    if kind is int and -2 ** 63 <= value < 2 ** 63:
+        return bytes((INT,)) + _i64.pack(value)
+    if kind is float:
+        return bytes((FLOAT,)) + _f64.pack(value)
+    if kind is datetime:
+        return bytes((DATETIME,)) + _i64.pack((value - EPOCH) // MICROSECOND)
+    raw = json.dumps(value).encode()
+    return bytes((JSON,)) + _u32.pack(len(raw)) + raw
+
+
+def _encode_names(names: Iterable[str]) -> bytes:
+    """ Encode a list of field names
+    """
+    return b"".join(_u16.pack(len(raw)) + raw
+                    for raw in (name.encode() for name in names))
+
+
+def dumps(rows: Iterable[Dict[str, Any]],
+          index_fields: Sequence[str] = ("id",)) -> bytes:
+    """ Encode attribute dictionaries, in one pass over rows
+
+    The index lists the offset and the index_fields values of each row.
+    """
+    fields = {}
+    records = []
+    offsets = array("Q")
+    columns = [[] for _ in index_fields]
+    offset = 0
+    for row in rows:
+        for key in row:
+            if key not in fields:
+                fields[key] = len(fields)
+        record = b"".join(
+            _u16.pack(fields[key]) + _encode_value(value)
+            for key, value in row.items())
+        records.append(_u32.pack(len(record)) + record)
+        offsets.append(offset)
+        for column, name in zip(columns, index_fields):
+            column.append(row.get(name))
+        offset += 4 + len(record)
+
+    header = MAGIC + _u32.pack(len(fields)) + _encode_names(fields) + \
+        _u32.pack(len(records))
+    if sys.byteorder != "little":
+        offsets.byteswap()
+    index = [_u16.pack(len(index_fields)), _encode_names(index_fields),
+             _u32.pack(len(records)), offsets.tobytes()]
+    for column in columns:
+        raw = json.dumps(column).encode()
+        index.append(_u32.pack(len(raw)) + raw)
+    index.append(_u64.pack(len(header) + offset) + INDEX_MAGIC)
+    return b"".join([header] + records + index)
+
+
+def decode_record(data: bytes, offset: int, end: int,
+                  fields: List[str]) -> Dict[str, Any]:
+    """ Decode the attributes stored between offset and end
+    """
+    row = {}
+    while offset < end:
+        field, tag = _attr.unpack_from(data, offset)
+        offset += 3
+        if tag == STR:
+            size = _u32.unpack_from(data, offset)[0]
+            offset += 4
+            value = data[offset:offset + size].decode()
+            offset += size
+        elif tag == DATETIME:
+            value = EPOCH + _i64.unpack_from(data, offset)[0] * MICROSECOND
+            offset += 8
+        elif tag == NONE:
+            value = None
+        elif tag == INT:
+            value = _i64.unpack_from(data, offset)[0]
+            offset += 8
+        elif tag == FLOAT:
+            value = _f64.unpack_from(data, offset)[0]
+            offset += 8
+        elif tag == TRUE or tag == FALSE:
+            value = tag == TRUE
+        elif tag == JSON:
+            size = _u32.unpack_from(data, offset)[0]
+            offset += 4
+            value = json.loads(data[offset:offset + size].decode())
+            offset += size
+        else:
+            raise ValueError("unknown type tag {}".format(tag))
+        row[fields[field]] = value
+    return row
+
+
+def _decode_names(data: bytes, offset: int, count: int) \
+        -> Tuple[List[str], int]:
+    """ Decode count field names, return them with the following offset
+    """
+    names = []
+    for _ in range(count):
+        size = _u16.unpack_from(data, offset)[0]
+        offset += 2
+        names.append(data[offset:offset + size].decode())
+        offset += size
+    return names, offset
+
+
+def read_header(data: bytes) -> Tuple[List[str], int, int]:
+    """ Read the field names, the record count and the offset of the
+        first record
+    """
+    if data[:4] != MAGIC:
+        raise ValueError("not a binary snapshot")
+    count = _u32.unpack_from(data, 4)[0]
+    fields, offset = _decode_names(data, 8, count)
+    records = _u32.unpack_from(data, offset)[0]
+    return fields, records, offset + 4
+
+
+def read_index(data: bytes) \
+        -> Optional[Tuple[array, Dict[str, List[Any]]]]:
+    """ Read the record offsets, from the first record, and the values
+        of each index field, both in record order
+
+    Returns None when the file has no index.
+    """
+    if len(data) < 12 or data[-4:] != INDEX_MAGIC:
+        return None
+    offset = _u64.unpack_from(data, len(data) - 12)[0]
+    count = _u16.unpack_from(data, offset)[0]
+    names, offset = _decode_names(data, offset + 2, count)
+    records = _u32.unpack_from(data, offset)[0]
+    offset += 4
+    offsets = array("Q")
+    offsets.frombytes(data[offset:offset + 8 * records])
+    if sys.byteorder != "little":
+        offsets.byteswap()
+    offset += 8 * records
+    columns = {}
+    for name in names:
+        size = _u32.unpack_from(data, offset)[0]
+        columns[name] = json.loads(data[offset + 4:offset + 4 + size])
+        offset += 4 + size
+    return offsets, columns
+
+
+def scan_index(data: bytes, index_fields: Sequence[str] = ("id",)) \
+        -> Tuple[array, Dict[str, List[Any]]]:
+    """ Build what read_index returns by decoding every record, for the
+        files written without an index
+    """
+    fields, records, offset = read_header(data)
+    start = offset
+    offsets = array("Q")
+    columns = {name: [] for name in index_fields}
+    for _ in range(records):
+        size = _u32.unpack_from(data, offset)[0]
+        row = decode_record(data, offset + 4, offset + 4 + size, fields)
+        offsets.append(offset - start)
+        for name, column in columns.items():
+            column.append(row.get(name))
+        offset += 4 + size
+    return offsets, columns
+
+
+def read_record(data: bytes, offset: int,
+                fields: List[str]) -> Dict[str, Any]:
+    """ Decode the record starting at offset
+    """
+    size = _u32.unpack_from(data, offset)[0]
+    return decode_record(data, offset + 4, offset + 4 + size, fields)
+
+
+def loads(data: bytes) -> List[Dict[str, Any]]:
+    """ Decode the attribute dictionaries of a snapshot
+    """
+    fields, records, offset = read_header(data)
+    rows = []
+    for _ in range(records):
+        size = _u32.unpack_from(data, offset)[0]
+        offset += 4
+        rows.append(decode_record(data, offset, offset + size, fields))
+        offset += size
+    return rows
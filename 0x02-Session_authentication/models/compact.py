@@ -0,0 +1,38 @@
+#!/usr/bin/env python3
+""" Compact module: slot-backed attributes of the compact models
+
+With MODELS_COMPACT=1 the models use __slots__ instead of a __dict__
+and keep their timestamps as epoch microseconds. Ids stay strings: the
+same string object is the DATA key (and the default session_id), so
+storing 16 bytes instead would only add a copy.
+"""
+from datetime import datetime
+from models.binary_format import EPOCH, MICROSECOND
+from typing import Any
+
+
+class TimestampField:
+    """ Attribute keeping a naive datetime as epoch microseconds in a slot
+    """
+
+    def __init__(self, slot: str):
+        """ Initialize the field over the given slot
+        """
+        self.slot = slot
+
+    def __get__(self, obj: Any, owner: type = None) -> Any:
+        """ Get the datetime
+        """
+        if obj is None:
+            return self
+        value = getattr(obj, self.slot)
+        if type(value) is int:
+            return EPOCH + value * MICROSECOND
+        return value
+
+    def __set__(self, obj: Any, value: Any):
+        """ Store a datetime as an int
+        """
+        if type(value) is datetime:
+            value = (value - EPOCH) // MICROSECOND
+        setattr(obj, self.slot, value)
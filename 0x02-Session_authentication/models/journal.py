@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+""" Journal module: append-only log of object writes
+"""
+from models import snapshot
+from os import path
+from typing import Iterable, Iterator
+import json
+import os
+import time
+
+
+def append(file_path: str, records: Iterable[dict]):
+    """ Append records to the journal, one JSON document per line,
+        following the snapshot fsync policy
+    """
+    start = time.perf_counter()
+    lines = "".join(json.dumps(record) + "\n" for record in records)
+    serialized = time.perf_counter()
+    with open(file_path, 'a') as f:
+        f.write(lines)
+        f.flush()
+        written = time.perf_counter()
+        if snapshot.should_sync(file_path):
+            os.fsync(f.fileno())
+    snapshot.record(file_path, serialized - start, written - serialized,
+                    time.perf_counter() - written)
+
+
+def replay(file_path: str) -> Iterator[dict]:
+    """ Yield the journal records in write order
+
+    A last line without its newline was cut by a crash: it is skipped
+    and cut from the file once read, so the next append starts on a new
+    line.
+    """
+    if not path.exists(file_path):
+        return
+    complete = 0
+    torn = False
+    with open(file_path, 'rb') as f:
+        for line in f:
+            if not line.endswith(b"\n"):
+                torn = True
+                break
+            yield json.loads(line)
+            complete += len(line)
+    if torn:
+        os.truncate(file_path, complete)
+
+
+def truncate(file_path: str):
+    """ Empty the journal once its records are in the snapshot
+    """
+    with open(file_path, 'w'):
+        pass
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+""" Lazy module: objects of a binary class file decoded on first access
+"""
+from collections import OrderedDict
+from collections.abc import MutableMapping
+from models import binary_format
+from typing import Any, Iterator, Tuple
+import mmap
+import threading
+
+
+class LazyObjects(MutableMapping):
+    """ Mapping of id to object backed by a binary class file
+
+    Only the id -> offset index is read when the file is opened. Objects
+    are decoded on first access and kept in an LRU of `cache_size`
+    objects. Objects stored since then are kept until the next `open`.
+    """
+
+    def __init__(self, cls: type, file_path: str, cache_size: int):
+        """ Map the class file
+        """
+        self.cls = cls
+        self.cache_size = cache_size
+        self._lock = threading.Lock()
+        self.index_rows: Iterator[Tuple[str, dict]] = iter(())
+        self.open(file_path)
+
+    def open(self, file_path: str):
+        """ (Re)map the class file, dropping the decoded objects
+
+        `index_rows` iterates once over the (id, indexed values) pairs
+        stored in the file index. Files written without an index have
+        their records decoded once to build it.
+        """
+        with open(file_path, 'rb') as f:
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            fields, _, start = binary_format.read_header(data)
+            index = binary_format.read_index(data)
+            if index is None:
+                index = binary_format.scan_index(
+                    data, ("id",) + self.cls.indexed_attributes)
+        except BaseException:
+            data.close()
+            raise
+        positions, columns = index
+        ids = columns.pop("id")
+        offsets = dict(zip(ids, (start + offset for offset in positions)))
+        names = list(columns)
+        rows = (dict(zip(names, values)) for values in zip(*columns.values()))
+        with self._lock:
+            previous = getattr(self, "_data", None)
+            self._data = data
+            self._fields = fields
+            self._offsets = offsets
+            self._ids = dict.fromkeys(offsets)
+            self._cache = OrderedDict()
+            self._stored = {}
+            if previous is not None:
+                previous.close()
+        self.index_rows = zip(ids, rows)
+
+    def __getitem__(self, obj_id: str) -> Any:
+        """ Get an object, decoding it on a cache miss
+        """
+        with self._lock:
+            obj = self._stored.get(obj_id)
+            if obj is not None:
+                return obj
+            obj = self._cache.get(obj_id)
+            if obj is not None:
+                self._cache.move_to_end(obj_id)
+                return obj
+            offset = self._offsets[obj_id]
+            obj = self.cls._from_attributes(binary_format.read_record(
+                self._data, offset, self._fields))
+            self._cache[obj_id] = obj
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+            return obj
+
+    def __setitem__(self, obj_id: str, obj: Any):
+        """ Store an object, kept decoded until the next `open`
+        """
+        with self._lock:
+            self._cache.pop(obj_id, None)
+            self._stored[obj_id] = obj
+            self._ids[obj_id] = None
+
+    def __delitem__(self, obj_id: str):
+        """ Remove an object
+        """
+        with self._lock:
+            del self._ids[obj_id]
+            self._offsets.pop(obj_id, None)
+            self._cache.pop(obj_id, None)
+            self._stored.pop(obj_id, None)
+
+    def __contains__(self, obj_id: object) -> bool:
+        """ Check an id without decoding its object
+        """
+        return obj_id in self._ids
+
+    def __iter__(self) -> Iterator[str]:
+        """ Iterate over the ids, in file then insertion order
+        """
+        return iter(list(self._ids))
+
+    def __len__(self) -> int:
+        """ Number of objects
+        """
+        return len(self._ids)
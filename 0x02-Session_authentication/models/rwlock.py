@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+""" RWLock module: readers-writer lock guarding the models storage
+"""
+from contextlib import contextmanager
+from typing import Iterator
+import threading
+
+
+class RWLock:
+    """ Lock shared by readers and exclusive to one writer
+
+    Both sides are reentrant, and a thread holding the write lock may
+    also read. Waiting writers go first: new readers wait for them,
+    unless they already read. A reader can not upgrade to writing.
+    """
+
+    def __init__(self):
+        """ Initialize an unlocked lock
+        """
+        self._cond = threading.Condition(threading.Lock())
+        self._readers = 0
+        self._writer = None
+        self._writes = 0
+        self._waiting_writers = 0
+        self._local = threading.local()
+
+    def acquire_read(self):
+        """ Wait until no writer holds or waits for the lock
+        """
+        me = threading.get_ident()
+        depth = getattr(self._local, "reads", 0)
+        with self._cond:
+            if self._writer != me and depth == 0:
+                while self._writer is not None or self._waiting_writers:
+                    self._cond.wait()
+            self._readers += 1
+        self._local.reads = depth + 1
+
+    def release_read(self):
+        """ Release one read
+        """
+        self._local.reads -= 1
+        with self._cond:
+            self._readers -= 1
+            if self._readers == 0:
+                self._cond.notify_all()
+
+    def acquire_write(self):
+        """ Wait until no other thread reads or writes
+        """
+        me = threading.get_ident()
+        with self._cond:
+            if self._writer == me:
+                self._writes += 1
+                return
+            if getattr(self._local, "reads", 0):
+                raise RuntimeError("cannot upgrade a read lock")
+            self._waiting_writers += 1
+            try:
+                while self._writer is not None or self._readers:
+                    self._cond.wait()
+            finally:
+                self._waiting_writers -= 1
+            self._writer = me
+            self._writes = 1
+
+    def release_write(self):
+        """ Release one write
+        """
+        with self._cond:
+            self._writes -= 1
+            if self._writes == 0:
+                self._writer = None
+                self._cond.notify_all()
+
+    @contextmanager
+    def read(self) -> Iterator[None]:
+        """ Hold the lock shared for the block
+        """
+        self.acquire_read()
+        try:
+            yield
+        finally:
+            self.release_read()
+
+    @contextmanager
+    def write(self) -> Iterator[None]:
+        """ Hold the lock exclusively for the block
+        """
+        self.acquire_write()
+        try:
+            yield
+        finally:
+            self.release_write()
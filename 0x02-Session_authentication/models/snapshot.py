@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+""" Snapshot module: crash-safe file writes and fsync policy
+"""
+from os import getenv, path
+from typing import Dict
+import os
+import threading
+import time
+
+
+# "always" syncs every write, "interval" syncs each snapshot before its
+# rename but the journals and directories at most every FSYNC_INTERVAL
+# seconds per file, "never" leaves it to the OS
+FSYNC_POLICY = getenv("MODELS_FSYNC", "never")
+FSYNC_INTERVAL = float(getenv("MODELS_FSYNC_INTERVAL", "1"))
+# Cumulative timings per file: count, serialize, write and fsync seconds
+STATS: Dict[str, Dict[str, float]] = {}
+_last_sync: Dict[str, float] = {}
+_lock = threading.Lock()
+
+
+def should_sync(file_path: str) -> bool:
+    """ Tell whether a write to file_path must be fsynced
+    """
+    if FSYNC_POLICY == "always":
+        return True
+    if FSYNC_POLICY != "interval":
+        return False
+    now = time.monotonic()
+    with _lock:
+        if now - _last_sync.get(file_path, 0) < FSYNC_INTERVAL:
+            return False
+        _last_sync[file_path] = now
+    return True
+
+
+def record(file_path: str, serialize: float = 0, write: float = 0,
+           fsync: float = 0):
+    """ Add the timings of one write of file_path to STATS
+    """
+    with _lock:
+        stats = STATS.setdefault(file_path, {"count": 0, "serialize": 0,
+                                             "write": 0, "fsync": 0})
+        stats["count"] += 1
+        stats["serialize"] += serialize
+        stats["write"] += write
+        stats["fsync"] += fsync
+
+
+def sync_directory(file_path: str):
+    """ Make a rename in the directory of file_path durable
+    """
+    fd = os.open(path.dirname(path.abspath(file_path)), os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def write_atomic(file_path: str, data: bytes, serialize: float = 0):
+    """ Replace file_path with data through a temporary file and a
+        rename, readers and crashes never see a partial file
+
+    Unless the policy is "never", the temporary file is synced before
+    the rename, which could otherwise replace the snapshot with a file
+    whose data never reached the disk. Only the directory sync, making
+    the rename itself durable, follows the interval.
+
+    serialize is the time spent building data, recorded with the write
+    and fsync timings.
+    """
+    sync = FSYNC_POLICY != "never"
+    sync_rename = should_sync(file_path)
+    tmp_path = "{}.{}.{}.tmp".format(file_path, os.getpid(),
+                                     threading.get_ident())
+    start = time.perf_counter()
+    try:
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+            f.flush()
+            written = time.perf_counter()
+            if sync:
+                os.fsync(f.fileno())
+        os.replace(tmp_path, file_path)
+    except BaseException:
+        if path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    if sync_rename:
+        sync_directory(file_path)
+    end = time.perf_counter()
+    record(file_path, serialize, written - start, end - written)
@@ -0,0 +1,283 @@
+#!/usr/bin/env python3
+""" SQLite storage module: one table per model class
+
+Each attribute of the class is a column, `id` is the primary key and
+the `indexed_attributes` get an index. Rows hold the to_json(True)
+values, so timestamps keep the class file format.
+"""
+from contextlib import contextmanager
+from datetime import datetime
+from models import snapshot
+from models.storage import Storage
+from os import getenv
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+import queue
+import sqlite3
+import threading
+
+
+# Connections opened at most, shared by the threads
+POOL_SIZE = int(getenv("MODELS_SQLITE_POOL_SIZE", "8"))
+
+
+class SQLiteStorage(Storage):
+    """ Storage engine writing each save and remove to a SQLite database
+
+    Threads borrow connections from a pool of at most pool_size, opened
+    on demand and kept, so a thread per request does not open one each
+    time. Outside a batch each write is its own transaction; a batch
+    keeps its connection and commits its writes together. Writes of the
+    process take turns on a lock rather than in the SQLite busy handler,
+    which sleeps.
+    """
+
+    def __init__(self, file_path: str, timeout: float = 30,
+                 pool_size: int = None):
+        """ Initialize the engine over the database file
+        """
+        self.file_path = file_path
+        self.timeout = timeout
+        self.pool_size = POOL_SIZE if pool_size is None else pool_size
+        self._idle: "queue.LifoQueue[sqlite3.Connection]" = \
+            queue.LifoQueue()
+        self._opened = 0
+        self._pool_lock = threading.Lock()
+        # Connection and depth of the batch of the current thread
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._write_lock = threading.RLock()
+        # Column names per class, in to_json order
+        self._columns: Dict[type, Tuple[str, ...]] = {}
+        self._upserts: Dict[type, str] = {}
+        self._updates: Dict[type, str] = {}
+
+    def _open(self) -> sqlite3.Connection:
+        """ Open and configure a connection of the pool
+        """
+        connection = sqlite3.connect(self.file_path, timeout=self.timeout,
+                                     isolation_level=None,
+                                     check_same_thread=False)
+        connection.row_factory = sqlite3.Row
+        connection.execute("PRAGMA journal_mode=WAL")
+        synchronous = "FULL" if snapshot.FSYNC_POLICY == "always" \
+            else "NORMAL"
+        connection.execute("PRAGMA synchronous={}".format(synchronous))
+        return connection
+
+    def _acquire(self) -> sqlite3.Connection:
+        """ Take an idle connection, open one while the pool is not
+            full, or wait for one
+        """
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._pool_lock:
+            can_open = self._opened < self.pool_size
+            if can_open:
+                self._opened += 1
+        if can_open:
+            try:
+                return self._open()
+            except BaseException:
+                with self._pool_lock:
+                    self._opened -= 1
+                raise
+        try:
+            return self._idle.get(timeout=self.timeout)
+        except queue.Empty:
+            raise TimeoutError("no SQLite connection available after "
+                               "{}s".format(self.timeout))
+
+    @contextmanager
+    def _connection(self) -> Iterator[sqlite3.Connection]:
+        """ Connection for the block: the one of the batch of the
+            thread, or one borrowed from the pool
+        """
+        connection = getattr(self._local, "connection", None)
+        if connection is not None:
+            yield connection
+            return
+        connection = self._acquire()
+        try:
+            yield connection
+        finally:
+            self._idle.put(connection)
+
+    @staticmethod
+    def _quote(name: str) -> str:
+        """ Quote a table or column name
+        """
+        return '"{}"'.format(name.replace('"', '""'))
+
+    def load(self, cls: type):
+        """ Create the table and indexes of a class, add its new
+            attributes to an existing table
+        """
+        table = self._quote(cls.__name__)
+        columns = tuple(cls().to_json(True))
+        with self._lock, self._connection() as connection:
+            connection.execute("CREATE TABLE IF NOT EXISTS {} ({})".format(
+                table, ", ".join(
+                    self._quote(name) + (" TEXT PRIMARY KEY"
+                                         if name == "id" else "")
+                    for name in columns)))
+            existing = {row["name"] for row in connection.execute(
+                "PRAGMA table_info({})".format(table))}
+            for name in columns:
+                if name not in existing:
+                    connection.execute("ALTER TABLE {} ADD COLUMN {}".format(
+                        table, self._quote(name)))
+            for name in cls.indexed_attributes:
+                connection.execute(
+                    "CREATE INDEX IF NOT EXISTS {} ON {} ({})".format(
+                        self._quote("ix_{}_{}".format(cls.__name__, name)),
+                        table, self._quote(name)))
+            self._columns[cls] = columns
+            self._upserts[cls] = \
+                "INSERT INTO {} ({}) VALUES ({}) ON CONFLICT(id) DO " \
+                "UPDATE SET {}".format(
+                    table, ", ".join(map(self._quote, columns)),
+                    ", ".join("?" * len(columns)),
+                    ", ".join("{0}=excluded.{0}".format(self._quote(name))
+                              for name in columns if name != "id"))
+            self._updates[cls] = "UPDATE {} SET {} WHERE id = ?".format(
+                table, ", ".join("{} = ?".format(self._quote(name))
+                                 for name in columns if name != "id"))
+
+    def _table(self, cls: type) -> Tuple[str, Tuple[str, ...]]:
+        """ Quoted table name and columns of a class, loaded if needed
+        """
+        if cls not in self._columns:
+            self.load(cls)
+        return self._quote(cls.__name__), self._columns[cls]
+
+    def _query(self, cls: type, where: str = "",
+               params: tuple = ()) -> List[Any]:
+        """ Objects of the rows matching the where clause
+        """
+        table, columns = self._table(cls)
+        with self._connection() as connection:
+            rows = connection.execute(
+                "SELECT {} FROM {} {} ORDER BY rowid".format(
+                    ", ".join(map(self._quote, columns)), table, where),
+                params).fetchall()
+        timestamps = [name for name in cls.timestamp_attributes
+                      if name in columns]
+        objs = []
+        for row in rows:
+            attributes = dict(zip(columns, row))
+            for name in timestamps:
+                if attributes[name] is not None:
+                    attributes[name] = datetime.fromisoformat(
+                        attributes[name])
+            objs.append(cls._from_attributes(attributes))
+        return objs
+
+    def get(self, cls: type, obj_id: str) -> Optional[Any]:
+        """ Return one object by ID, or None
+        """
+        objs = self._query(cls, "WHERE id = ?", (obj_id,))
+        return objs[0] if objs else None
+
+    def search(self, cls: type, attributes: dict) -> List[Any]:
+        """ Return the objects with matching attributes, in insertion
+            order, through the column indexes when there are some
+        """
+        _, columns = self._table(cls)
+        conditions = []
+        params = []
+        for name, value in attributes.items():
+            if name not in columns:
+                # No object has this attribute
+                return []
+            if value is None:
+                conditions.append("{} IS NULL".format(self._quote(name)))
+                continue
+            if type(value) is datetime:
+                # Stored as formatted by to_json
+                value = value.isoformat(timespec="seconds")
+            conditions.append("{} = ?".format(self._quote(name)))
+            params.append(value)
+        where = "WHERE " + " AND ".join(conditions) if conditions else ""
+        return self._query(cls, where, tuple(params))
+
+    def ids(self, cls: type, start: int = 0,
+            stop: Optional[int] = None) -> List[str]:
+        """ IDs of the objects from position start to stop, in insertion
+            order
+        """
+        table, _ = self._table(cls)
+        limit = -1 if stop is None else max(stop - start, 0)
+        with self._connection() as connection:
+            rows = connection.execute(
+                "SELECT id FROM {} ORDER BY rowid LIMIT ? OFFSET ?"
+                .format(table), (limit, start)).fetchall()
+        return [row[0] for row in rows]
+
+    def count(self, cls: type) -> int:
+        """ Count the objects of a class
+        """
+        table, _ = self._table(cls)
+        with self._connection() as connection:
+            return connection.execute(
+                "SELECT COUNT(*) FROM {}".format(table)).fetchone()[0]
+
+    def save(self, obj: Any):
+        """ Insert or update the row of an object, keeping its position
+        """
+        cls = obj.__class__
+        _, columns = self._table(cls)
+        values = obj.to_json(True)
+        with self._write_lock, self._connection() as connection:
+            connection.execute(self._upserts[cls],
+                               tuple(values.get(name) for name in columns))
+
+    def update(self, obj: Any) -> bool:
+        """ Update the row of an object, if there is one
+        """
+        cls = obj.__class__
+        _, columns = self._table(cls)
+        values = obj.to_json(True)
+        with self._write_lock, self._connection() as connection:
+            cursor = connection.execute(
+                self._updates[cls],
+                tuple(values.get(name) for name in columns if name != "id") +
+                (obj.id,))
+            return cursor.rowcount > 0
+
+    def remove(self, obj: Any):
+        """ Delete the row of an object
+        """
+        table, _ = self._table(obj.__class__)
+        with self._write_lock, self._connection() as connection:
+            connection.execute(
+                "DELETE FROM {} WHERE id = ?".format(table), (obj.id,))
+
+    @contextmanager
+    def batch(self) -> Iterator[None]:
+        """ Run the writes of the block in one transaction, committed
+            when the outermost batch of the thread exits
+        """
+        with self._write_lock:
+            if getattr(self._local, "batches", 0) == 0:
+                connection = self._acquire()
+                try:
+                    connection.execute("BEGIN IMMEDIATE")
+                except BaseException:
+                    self._idle.put(connection)
+                    raise
+                self._local.connection = connection
+                self._local.batches = 0
+            self._local.batches += 1
+            try:
+                yield
+            finally:
+                self._local.batches -= 1
+                if self._local.batches == 0:
+                    connection = self._local.connection
+                    self._local.connection = None
+                    try:
+                        connection.execute("COMMIT")
+                    finally:
+                        self._idle.put(connection)
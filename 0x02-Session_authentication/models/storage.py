@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+""" Storage module: interface of the storage engines behind Base
+
+Base keeps its objects in DATA and the class files by default. A class
+whose `storage` is set hands its loads, reads and writes to that engine
+instead.
+"""
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from typing import Any, Iterator, List, Optional
+
+
+class Storage(ABC):
+    """ Storage engine of model classes
+
+    Engines implement every abstract method, an incomplete one can not
+    be instantiated.
+    """
+
+    @abstractmethod
+    def load(self, cls: type):
+        """ Prepare the storage of a class
+        """
+        raise NotImplementedError()
+
+    @abstractmethod
+    def get(self, cls: type, obj_id: str) -> Optional[Any]:
+        """ Return one object by ID, or None
+        """
+        raise NotImplementedError()
+
+    @abstractmethod
+    def search(self, cls: type, attributes: dict) -> List[Any]:
+        """ Return the objects with matching attributes, in storage order
+        """
+        raise NotImplementedError()
+
+    @abstractmethod
+    def ids(self, cls: type, start: int = 0,
+            stop: Optional[int] = None) -> List[str]:
+        """ IDs of the objects from position start to stop
+        """
+        raise NotImplementedError()
+
+    @abstractmethod
+    def count(self, cls: type) -> int:
+        """ Count the objects of a class
+        """
+        raise NotImplementedError()
+
+    @abstractmethod
+    def save(self, obj: Any):
+        """ Insert or update an object
+        """
+        raise NotImplementedError()
+
+    @abstractmethod
+    def update(self, obj: Any) -> bool:
+        """ Update an object only if it is stored, return whether it was
+        """
+        raise NotImplementedError()
+
+    @abstractmethod
+    def remove(self, obj: Any):
+        """ Remove an object
+        """
+        raise NotImplementedError()
+
+    @contextmanager
+    def batch(self) -> Iterator[None]:
+        """ Group the writes of the block, when the engine can
+        """
+        yield
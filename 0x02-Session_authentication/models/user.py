@@ -2,12 +2,15 @@
 """ User module
 """
 import hashlib
-from models.base import Base
+from models.base import Base, COMPACT
 
 
 class User(Base):
     """ User class
     """
+    indexed_attributes = ("email",)
+    if COMPACT:
+        __slots__ = ("email", "_password", "first_name", "last_name")
 
     def __init__(self, *args: list, **kwargs: dict):
         """ Initialize a User instance
@@ -2,12 +2,16 @@
 """
 User session module
 """
-from models.base import Base
+from models.base import Base, COMPACT
 
 
 class UserSession(Base):
     """ session object representing user session info
     """
+    indexed_attributes = ("session_id", "user_id")
+    if COMPACT:
+        __slots__ = ("user_id", "session_id")
+
     def __init__(self, *args: list, **kwargs: dict):
         """ Initialize UserSession instance
         """
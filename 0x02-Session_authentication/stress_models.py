@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+""" Hammer the models storage with saves, removes and searches from many
+threads, then check the class file against the objects in memory, and
+that a journal cut by a crash still loads once written again
+"""
+from concurrent.futures import ThreadPoolExecutor
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+
+def worker(worker_id: int, operations: int) -> int:
+    """ Run random operations on users of this worker, return the number
+        of errors found in the results
+    """
+    from models.user import User
+
+    errors = 0
+    mine = []
+    rng = random.Random(worker_id)
+    for i in range(operations):
+        choice = rng.random()
+        if choice < 0.5 or not mine:
+            user = User(email="w{}-{}@stress".format(worker_id, i))
+            user.save()
+            mine.append(user)
+        elif choice < 0.7:
+            user = mine.pop(rng.randrange(len(mine)))
+            user.remove()
+            if User.get(user.id) is not None:
+                errors += 1
+        else:
+            user = rng.choice(mine)
+            if User.search({"email": user.email}) != [user]:
+                errors += 1
+            User.search({"first_name": None})
+    return errors
+
+
+def run(threads: int, operations: int):
+    """ Run the workers and check the stored state
+    """
+    from models.user import User
+
+    User.load_from_file()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(threads) as pool:
+        errors = sum(pool.map(worker, range(threads),
+                              [operations] * threads))
+    elapsed = time.perf_counter() - start
+    expected = {user.id: user.to_json(True) for user in User.all()}
+
+    User.load_from_file()
+    stored = {user.id: user.to_json(True) for user in User.all()}
+    if stored != expected:
+        errors += 1
+        print("class file differs from memory: {} stored, {} expected"
+              .format(len(stored), len(expected)))
+    total = threads * operations
+    print("{} threads, {} operations in {:.2f}s ({:.0f} ops/s), "
+          "{} users, {} errors".format(threads, total, elapsed,
+                                       total / elapsed,
+                                       User.count(), errors))
+    return errors
+
+
+def check_torn_journal() -> int:
+    """ Cut a journal record as a crash would, write once more and reload,
+        return the number of errors
+    """
+    from models import base
+    from models.user import User
+
+    if User.storage is not None:
+        return 0
+    storage_mode = User.storage_mode
+    User.storage_mode = "journal"
+    try:
+        User.load_from_file()
+        saved = [User(email="torn{}@stress".format(i)) for i in range(3)]
+        for user in saved:
+            user.save()
+        base.flush()
+        with open(User._journal_path(), 'a') as f:
+            f.write('{"op": "save", "id": "torn", "obj"')
+        User.load_from_file()
+        saved.append(User(email="after-torn@stress"))
+        saved[-1].save()
+        base.flush()
+        User.load_from_file()
+        missing = [user for user in saved if User.get(user.id) != user]
+    except Exception as e:
+        print("torn journal: {!r}".format(e))
+        return 1
+    finally:
+        User.storage_mode = storage_mode
+    print("torn journal: {} of {} users missing after reload"
+          .format(len(missing), len(saved)))
+    return len(missing)
+
+
+if __name__ == "__main__":
+    threads = int(sys.argv[1]) if len(sys.argv) > 1 else 16
+    operations = int(sys.argv[2]) if len(sys.argv) > 2 else 500
+    # Run in a scratch directory, the class files and database of the
+    # current one belong to the API
+    directory = tempfile.mkdtemp()
+    os.environ["MODELS_SQLITE_PATH"] = os.path.join(directory,
+                                                    ".db_models.sqlite3")
+    os.chdir(directory)
+    try:
+        errors = run(threads, operations)
+        errors += check_torn_journal()
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+    sys.exit(1 if errors else 0)
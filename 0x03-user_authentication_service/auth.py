@@ -1,17 +1,26 @@
 #!/usr/bin/env python3
 """Authentication module for user management and session handling"""
 import bcrypt
+import os
+from concurrent.futures import ThreadPoolExecutor
 from db import DB
+from threading import Lock
+from typing import Dict, Optional, Tuple
 from user import User
 from uuid import uuid4
 from sqlalchemy.orm.exc import NoResultFound
 
+BCRYPT_ROUNDS = int(os.environ.get("BCRYPT_ROUNDS", 12))
+
 
 class Auth:
     """Handles authentication operations with the database"""
 
     def __init__(self):
         self._db = DB()
+        self._rehash_pool = ThreadPoolExecutor(max_workers=1)
+        self._rehash_lock = Lock()
+        self._rehashed: Dict[int, Tuple[bytes, Optional[bytes]]] = {}
 
     def register_user(self, email: str, password: str) -> User:
         """Register new user if email doesn't exist"""
@@ -22,13 +31,58 @@ class Auth:
             return self._db.add_user(email, _hash_password(password))
 
     def valid_login(self, email: str, password: str) -> bool:
-        """Validate user credentials"""
+        """Validate user credentials, refreshing outdated hash costs"""
+        self._store_rehashed()
         try:
             user = self._db.find_user_by(email=email)
-            return bcrypt.checkpw(password.encode('utf-8'),
-                                  user.hashed_password)
+            valid = bcrypt.checkpw(password.encode('utf-8'),
+                                   user.hashed_password)
         except NoResultFound:
             return False
+        if valid and _hash_cost(user.hashed_password) not in (
+                None, BCRYPT_ROUNDS):
+            self._rehash(user.id, user.hashed_password, password)
+        return valid
+
+    def _rehash(self, user_id: int, hashed: bytes, password: str) -> None:
+        """Hash password with BCRYPT_ROUNDS on the background pool"""
+        with self._rehash_lock:
+            if user_id in self._rehashed:
+                return
+            self._rehashed[user_id] = (hashed, None)
+
+        def run() -> None:
+            """Compute the new hash off the request thread"""
+            try:
+                new_hash = _hash_password(password)
+            except Exception:
+                with self._rehash_lock:
+                    del self._rehashed[user_id]
+                return
+            with self._rehash_lock:
+                self._rehashed[user_id] = (hashed, new_hash)
+
+        self._rehash_pool.submit(run)
+
+    def _store_rehashed(self) -> None:
+        """Save the finished rehashes whose user kept the same password
+
+        The DB session is not thread safe, so the background pool only
+        computes hashes and the request thread writes them.
+        """
+        with self._rehash_lock:
+            done = {user_id: hashes
+                    for user_id, hashes in self._rehashed.items()
+                    if hashes[1] is not None}
+            for user_id in done:
+                del self._rehashed[user_id]
+        for user_id, (old_hash, new_hash) in done.items():
+            try:
+                user = self._db.find_user_by(id=user_id)
+            except NoResultFound:
+                continue
+            if user.hashed_password == old_hash:
+                self._db.update_user(user_id, hashed_password=new_hash)
 
     def create_session(self, email: str) -> str:
         """Create session for user"""
@@ -76,7 +130,15 @@ class Auth:
 
 def _hash_password(password: str) -> bytes:
     """Create password hash"""
-    return bcrypt.hashpw(password.encode(), bcrypt.gensalt())
+    return bcrypt.hashpw(password.encode(), bcrypt.gensalt(BCRYPT_ROUNDS))
+
+
+def _hash_cost(hashed_password: bytes) -> Optional[int]:
+    """Read the work factor of a bcrypt hash"""
+    try:
+        return int(hashed_password.split(b"$")[2])
+    except (IndexError, ValueError):
+        return None
 
 
 def _generate_uuid() -> str: